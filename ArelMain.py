@@ -8,14 +8,31 @@ import random
 import pygame
 import datetime
 import time
+import collections
+import heapq
+import fractions
+
+try:
+    import numpy
+except ImportError:
+    numpy = None  #ai maps fall back to plain python lists
 
 #actual size of the window
 SCREEN_WIDTH = 80
 SCREEN_HEIGHT = 50
  
-#size of the map
+#size of the map, it can be bigger than the screen
 MAP_WIDTH = 80
 MAP_HEIGHT = 43
+
+#size of the part of the map shown on screen, the camera follows the player around bigger maps
+CAMERA_WIDTH = 80
+CAMERA_HEIGHT = 43
+camera_x = 0  #map position of the top left corner of the screen
+camera_y = 0
+
+#the map's Tile views are made TILE_CHUNK columns at a time, the first time any of them is used
+TILE_CHUNK = 16
  
 #sizes and coordinates relevant for the GUI
 BAR_WIDTH = 20
@@ -26,6 +43,14 @@ MSG_WIDTH = SCREEN_WIDTH - BAR_WIDTH - 2
 MSG_HEIGHT = PANEL_HEIGHT - 1
 INVENTORY_WIDTH = 50
 CHARACTER_SCREEN_WIDTH = 30
+
+#render layers, render_all draws them in this order so the later ones appear on top
+LAYER_FEATURE = 0  #doors, stairs
+LAYER_ITEM = 1
+LAYER_CORPSE = 2
+LAYER_ACTOR = 3  #monsters
+LAYER_PLAYER = 4
+LAYER_COUNT = 5
 LEVEL_SCREEN_WIDTH = 40
  
 #parameters for dungeon generator
@@ -56,6 +81,40 @@ FIREBALL_DAMAGE = 25
 LEVEL_UP_BASE = 200
 LEVEL_UP_FACTOR = 150
  
+#ai (dijkstra) maps
+#'numpy' relaxes the whole map at once, 'python' walks outward from the goals. python is the
+#quickest for what the game does every turn (moving the player goal, sounds, get_move_options),
+#see benchmark.py. numpy only wins for full rebuilds with many goals
+DIJKSTRA_BACKEND = 'python'
+map_version = 0  #bumped whenever walls or doors change, see passability_changed()
+map_rebuilt = 0  #map_version of the last change to the whole map (a new level)
+map_changes = []  #(map_version, x, y) of every tile changed since then, see changed_since()
+passability_cache = None
+open_lists = None  #where the ai maps can spread, see get_open_lists()
+DIJKSTRA_CACHE_SIZE = 16  #how many finished maps cached_dijkstra() keeps around
+dijkstra_cache = collections.OrderedDict()
+
+#scent (needs numpy, without it monsters just use the player dijkstra)
+SCENT_STRENGTH = 100.0  #how much scent the player leaves on each step
+SCENT_DIFFUSION = 0.5  #how much of a cell's scent is swapped for its neighborhood average each turn
+SCENT_EVAPORATION = 0.1  #fraction of the scent lost each turn
+SCENT_MIN = 1.0  #anything fainter than this is gone
+scent_steps = None  #which way the scent gets stronger from each cell, see spread_scent()
+scent_box = None  #(x0, y0, x1, y1), inclusive, around every cell holding scent. None if there's none
+
+#sounds made this turn, spread all at once by apply_turn_events() before and after the monsters act
+turn_sounds = []  #(x, y, intensity) of every sound made
+
+#doors on the current level, (x, y) -> the door's Object. its name ('closed door' or 'open door')
+#is the door's state, set_door() keeps it, the tile and the FOV/ai maps in step
+doors = {}
+
+#monster activation: far away monsters sleep until they notice the player, see monster_awake()
+WAKE_DISTANCE = 8  #player_dijkstra score at or under which a monster wakes up
+WAKE_SOUND = 1  #sound_dijkstra intensity at or over which a monster wakes up
+SLEEP_AFTER = 10  #turns without noticing the player before an awake monster dozes off again
+DORMANT_MOVE_CHANCE = 4  #a sleeping monster shuffles one step about 1 in this many turns (0 = never)
+ 
 FOV_ALGO = 0  #default FOV algorithm
 FOV_LIGHT_WALLS = True  #light walls or not
 TORCH_RADIUS = 10
@@ -115,22 +174,109 @@ color_light_wall_bk = libtcod.black
 color_dark_ground_bk = libtcod.black
 color_light_ground_bk = libtcod.black
  
-class Tile:
-    #a tile of the map and its properties
-    def __init__(self, blocked, block_sight = None, is_door = False):
-        self.blocked = blocked
-        self.is_door = is_door
- 
-        #all tiles start unexplored
-        self.explored = False
- 
-        #by default, if a tile is blocked, it also blocks sight
-        if block_sight is None: block_sight = blocked
+class TileMap:
+    #the dungeon map. each tile property is kept whole in its own array indexed [x][y] or [x, y]
+    #(a numpy bool array, or a ListPlane without numpy), so the code that looks at every tile can
+    #read a plane at once. map[x][y] still gives a Tile for reading and setting one tile's
+    #properties, those are only made for the chunks of the map something looks at. the Tile is
+    #the slow way, code that runs every turn reads the planes
+    planes = ('blocked', 'block_sight', 'is_door', 'explored')
+    
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        
+        #every tile starts as an unexplored wall that blocks sight
+        self.blocked = self.new_plane(True)
+        self.block_sight = self.new_plane(True)
+        self.is_door = self.new_plane(False)
+        self.explored = self.new_plane(False)
+        
+        self.columns = [None for x in range(width)]
+        
+    def new_plane(self, value):
+        if numpy is not None:
+            return numpy.full((self.width, self.height), value, dtype=bool)
+        return ListPlane([value for y in range(self.height)] for x in range(self.width))
+        
+    def as_lists(self, plane):
+        #a plane as plain nested lists [x][y], quicker to read cell by cell than a numpy array.
+        #only for reading, without numpy the columns are the plane's own
+        plane = getattr(self, plane)
+        if numpy is not None:
+            return plane.tolist()
+        return list(plane)
+        
+    def window(self, plane, x, y, width, height):
+        #like as_lists, but only the width x height part with its top left corner at x, y
+        plane = getattr(self, plane)
+        if numpy is not None:
+            return plane[x:x+width, y:y+height].tolist()
+        return [column[y:y+height] for column in plane[x:x+width]]
+        
+    def __getitem__(self, x):
+        column = self.columns[x]
+        if column is None:
+            if x < 0:
+                x += self.width
+            start = x - x % TILE_CHUNK
+            for cx in range(start, min(start + TILE_CHUNK, self.width)):
+                self.columns[cx] = [Tile(self, cx, y) for y in range(self.height)]
+            column = self.columns[x]
+        return column
+        
+    def __len__(self):
+        return self.width
+        
+    def __getstate__(self):
+        #the Tile views are rebuilt on load, only the planes get saved
+        state = self.__dict__.copy()
+        del state['columns']
+        return state
+        
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.columns = [None for x in range(self.width)]
+
+class ListPlane(list):
+    #a plane without numpy: a list of columns, that can also be indexed [x, y] like a numpy array
+    def __getitem__(self, index):
+        if type(index) is tuple:
+            return list.__getitem__(self, index[0])[index[1]]
+        return list.__getitem__(self, index)
         
-        self.block_sight = block_sight
+    def __setitem__(self, index, value):
+        if type(index) is tuple:
+            list.__getitem__(self, index[0])[index[1]] = value
+        else:
+            list.__setitem__(self, index, value)
+
+def tile_property(plane):
+    #a Tile attribute that reads and writes the tile's cell in one of the TileMap planes
+    def get(self):
+        return bool(getattr(self.tiles, plane)[self.x, self.y])
+    def set(self, value):
+        getattr(self.tiles, plane)[self.x, self.y] = bool(value)
+    return property(get, set)
+        
+class Tile(object):
+    #a tile of the map and its properties, which live in the TileMap planes
+    __slots__ = ('tiles', 'x', 'y')
+    
+    def __init__(self, tiles, x, y):
+        self.tiles = tiles
+        self.x = x
+        self.y = y
+        
+    blocked = tile_property('blocked')
+    block_sight = tile_property('block_sight')
+    is_door = tile_property('is_door')
+    explored = tile_property('explored')
  
-class Rect:
+class Rect(object):
     #a rectangle on the map. used to characterize a room.
+    __slots__ = ('x1', 'y1', 'x2', 'y2')
+    
     def __init__(self, x, y, w, h):
         self.x1 = x
         self.y1 = y
@@ -147,10 +293,14 @@ class Rect:
         return (self.x1 <= other.x2 and self.x2 >= other.x1 and
                 self.y1 <= other.y2 and self.y2 >= other.y1)
  
-class Object:
+class Object(object):
     #this is a generic object: the player, a monster, an item, the stairs...
     #it's always represented by a character on screen.
-    def __init__(self, x, y, char, name, color, blocks=False, always_visible=False, fighter=None, ai=None, item=None, equipment=None):
+    __slots__ = ('x', 'y', 'char', 'name', 'color', 'blocks', 'always_visible',
+                 'fighter', 'ai', 'item', 'equipment', 'layer',
+                 'level', 'max_oil_level', 'oil')
+    
+    def __init__(self, x, y, char, name, color, blocks=False, always_visible=False, fighter=None, ai=None, item=None, equipment=None, layer=None):
         self.x = x
         self.y = y
         self.char = char
@@ -177,6 +327,19 @@ class Object:
             #there must be an Item component for the Equipment component to work properly
             self.item = Item()
             self.item.owner = self
+            
+        #which render layer it's drawn on, monsters and items unless told otherwise
+        if layer is None:
+            if self.fighter:
+                layer = LAYER_ACTOR
+            else:
+                layer = LAYER_ITEM
+        self.layer = layer
+        
+        #only the player uses these, new_game sets them
+        self.level = None
+        self.max_oil_level = None
+        self.oil = None
  
     def move(self, dx, dy):
         #move by the given amount, if the destination is not blocked
@@ -184,6 +347,7 @@ class Object:
             self.clear()
             self.x += dx
             self.y += dy
+            objects.relocate(self)
             self.draw()
             
     def move_towards(self, target_x, target_y):
@@ -216,41 +380,34 @@ class Object:
         
         if 0 <= (self.x+dx) < MAP_WIDTH and 0 <= (self.y+dy) < MAP_HEIGHT:
             #in range
-            if map[self.x+dx][self.y+dy].is_door:   #is it a door?
-                for obj in objects:
-                    if obj.x == self.x+dx and obj.y == self.y+dy and obj.name == "closed door":
-                        n = libtcod.random_get_int(0, 1, 4)
-                        if n >= 2: #3.4 chance to try to open the door
-                                
-                            chance_break_door = 0
-                            for diceroll in range(1, 4):
-                                chance_break_door = chance_break_door + libtcod.random_get_int(0, 1, 6) 
-                                print str(chance_break_door)
+            door = doors.get((self.x+dx, self.y+dy))
+            if door is not None:   #is it a door?
+                if door.name == "closed door":
+                    n = libtcod.random_get_int(0, 1, 4)
+                    if n >= 2: #3.4 chance to try to open the door
                             
-                            chance_break_door = chance_break_door + self.fighter.modifier(self.fighter.strength)
+                        chance_break_door = 0
+                        for diceroll in range(1, 4):
+                            chance_break_door = chance_break_door + libtcod.random_get_int(0, 1, 6) 
                             print str(chance_break_door)
-                                
-                            bd_check = 14
-                            if chance_break_door >= bd_check:
-                                for obj in objects:
-                                    if obj.x == self.x+dx and obj.y == self.y + dy and obj.name == "closed door":
-                                        obj.name = 'open door'
-                                        obj.char = '-'
-                                        map[obj.x][obj.y].block_sight = False
-                                        map[obj.x][obj.y].blocked = False
-                                        if libtcod.map_is_in_fov(fov_map, self.x+dx, self.y+dy):
-                                            message("The door crashes open!", libtcod.light_orange)
-                                            Play_BGSFX(SFX_DOORBREAK)
-                                        map_sound(obj.x, obj.y, 15)
-                                        fov_recompute = True
-                                        initialize_fov()
-                                        
-                                
-                            else:                  
-                                #print "knock knock"
-                                if libtcod.map_is_in_fov(fov_map, self.x+dx, self.y+dy):
-                                    message("The door shakes from the other side.",libtcod.white)
-                                    Play_BGSFX(SFX_DOORSHAKE)
+                        
+                        chance_break_door = chance_break_door + self.fighter.modifier(self.fighter.strength)
+                        print str(chance_break_door)
+                            
+                        bd_check = 14
+                        if chance_break_door >= bd_check:
+                            set_door(door.x, door.y, True)
+                            if libtcod.map_is_in_fov(fov_map, self.x+dx, self.y+dy):
+                                message("The door crashes open!", libtcod.light_orange)
+                                Play_BGSFX(SFX_DOORBREAK)
+                            queue_sound(door.x, door.y, 15)
+                                    
+                            
+                        else:                  
+                            #print "knock knock"
+                            if libtcod.map_is_in_fov(fov_map, self.x+dx, self.y+dy):
+                                message("The door shakes from the other side.",libtcod.white)
+                                Play_BGSFX(SFX_DOORSHAKE)
             
             if map[self.x+dx][self.y+dy].block_sight == False and open: #you can move there
                 self.move(dx, dy) #move
@@ -267,15 +424,16 @@ class Object:
         fov = libtcod.map_new(MAP_WIDTH, MAP_HEIGHT)
  
         #Scan the current map each turn and set all the walls as unwalkable
+        (block_sight, blocked) = (map.block_sight, map.blocked)
         for y1 in range(MAP_HEIGHT):
             for x1 in range(MAP_WIDTH):
-                libtcod.map_set_properties(fov, x1, y1, not map[x1][y1].block_sight, not map[x1][y1].blocked)
+                libtcod.map_set_properties(fov, x1, y1, not block_sight[x1, y1], not blocked[x1, y1])
  
         #Scan all the objects to see if there are objects that must be navigated around
         #Check also that the object isn't self or the target (so that the start and the end points are free)
         #The AI class handles the situation if self is next to the target so it will not use this A* function anyway   
-        for obj in objects:
-            if obj.blocks and obj != self and obj != target:
+        for obj in objects.blockers:
+            if obj != self and obj != target:
                 #Set the tile as a wall so it must be navigated around
                 libtcod.map_set_properties(fov, obj.x, obj.y, True, False)
  
@@ -296,13 +454,15 @@ class Object:
                 #Set self's coordinates to the next path tile
                 self.x = x
                 self.y = y
+                objects.relocate(self)
         else:
             #Keep the old move function as a backup so that if there are no paths (for example another monster blocks a corridor)
             #it will still try to move towards the player (closer to the corridor opening)
             self.move_towards(target.x, target.y)  
  
-        #Delete the path to free memory
+        #Delete the path and the map to free memory
         libtcod.path_delete(my_path)
+        libtcod.map_delete(fov)
 
     def distance_to(self, other):
         #return the distance to another object
@@ -314,102 +474,280 @@ class Object:
         #return the distance to some coordinates
         return math.sqrt((x - self.x) ** 2 + (y - self.y) ** 2)
  
-    def send_to_back(self):
-        #make this object be drawn first, so all others appear above it if they're in the same tile.
-        global objects
-        objects.remove(self)
-        objects.insert(0, self)
- 
     def draw(self):
         #only show if it's visible to the player; or it's set to "always visible" and on an explored tile
+        (x, y) = to_camera_coordinates(self.x, self.y)
+        if x is None:
+            return  #off screen
         if (libtcod.map_is_in_fov(fov_map, self.x, self.y) or
                  (self.always_visible and map[self.x][self.y].explored)):
                     #set the color and then draw the character that represents this object at its position
                     libtcod.console_set_default_foreground(con, self.color)
-                    libtcod.console_put_char(con, self.x, self.y, self.char, libtcod.BKGND_NONE)
+                    libtcod.console_put_char(con, x, y, self.char, libtcod.BKGND_NONE)
  
     def clear(self):
         #erase the character that represents this object
-        libtcod.console_put_char(con, self.x, self.y, ' ', libtcod.BKGND_NONE)
+        (x, y) = to_camera_coordinates(self.x, self.y)
+        if x is not None:
+            libtcod.console_put_char(con, x, y, ' ', libtcod.BKGND_NONE)
+
+
+class ObjectList(list):
+    #the objects list, plus live indexes of the objects that have each component (fighter, ai,
+    #item, equipment) or are each kind of thing (door, stairs, corpse), so a loop over one of
+    #those can skip everything else. call reindex(obj) after adding or removing a component
+    #or renaming an object.
+    #it also files every object under the tile it's on, so at(x, y) only looks at that tile,
+    #and counts the blocking objects on each tile in the occupied grid (same size as the map).
+    #call relocate(obj) after changing the x, y of an object that's in the list, and reindex(obj)
+    #after changing its blocks or layer.
+    #the objects on each render layer are kept apart too, in the order they were added, so
+    #render_all can draw them bottom layer first without sorting.
+    #the indexes are ordered the same way, so a loop over one runs in the same order every game.
+    #add and take objects out with append, insert, extend, +=, remove, pop or del objects[i];
+    #assigning into the list or deleting a slice would skip the indexes, so those raise TypeError
+    index_keys = ('fighter', 'ai', 'item', 'equipment', 'door', 'stairs', 'corpse')
+    
+    def __init__(self, items=()):
+        list.__init__(self)
+        self.indexes = dict((key, collections.OrderedDict()) for key in ObjectList.index_keys)
+        self.keys_of = {}  #object -> the indexes it's in
+        self.tiles = {}    #(x, y) -> the objects on that tile, in list order
+        self.tile_of = {}  #object -> the tile it's filed under
+        self.occupied = [[0 for y in range(MAP_HEIGHT)] for x in range(MAP_WIDTH)]
+        self.blockers = {}  #blocking object -> the tile it's counted on
+        self.layers = [collections.OrderedDict() for layer in range(LAYER_COUNT)]
+        self.layer_of = {}  #object -> the layer it's filed under
+        for obj in items:
+            self.append(obj)
+            
+    def having(self, key):
+        #the objects in one index, as a list so the loop can change things as it goes
+        return list(self.indexes[key])
+        
+    def at(self, x, y):
+        #the objects on a tile, as a list so the loop can change things as it goes
+        return list(self.tiles.get((x, y), ()))
+        
+    def in_render_order(self):
+        #every object, bottom layer first
+        for layer in self.layers:
+            for obj in layer:
+                yield obj
+        
+    def append(self, obj):
+        list.append(self, obj)
+        self.add_to_indexes(obj)
+        self.add_to_tile(obj, False)
+        self.add_to_layer(obj)
+        
+    def insert(self, i, obj):
+        list.insert(self, i, obj)
+        self.add_to_indexes(obj)
+        self.add_to_tile(obj, i == 0)
+        self.add_to_layer(obj)
+        
+    def extend(self, objs):
+        for obj in objs:
+            self.append(obj)
+            
+    def __iadd__(self, objs):
+        self.extend(objs)
+        return self
+        
+    def remove(self, obj):
+        list.remove(self, obj)
+        self.forget(obj)
+        
+    def pop(self, i=-1):
+        obj = list.pop(self, i)
+        self.forget(obj)
+        return obj
+        
+    def __delitem__(self, i):
+        if isinstance(i, slice):
+            self.refuse()
+        self.pop(i)
+        
+    def refuse(self, *args):
+        raise TypeError('ObjectList only changes through append, insert, extend, remove and pop')
+    __setitem__ = __setslice__ = __delslice__ = __imul__ = refuse
+        
+    def forget(self, obj):
+        #takes an object that just left the list out of the indexes, its tile and its layer
+        self.remove_from_indexes(obj)
+        self.remove_from_tile(obj)
+        self.remove_from_layer(obj)
+        
+    def relocate(self, obj):
+        if obj in self.tile_of and self.tile_of[obj] != (obj.x, obj.y):
+            self.remove_from_tile(obj)
+            self.add_to_tile(obj, False)
+            
+    def reindex(self, obj):
+        if obj in self.keys_of:
+            self.remove_from_indexes(obj)
+            self.add_to_indexes(obj)
+            self.remove_blocker(obj)
+            self.add_blocker(obj)
+            if self.layer_of[obj] != obj.layer:
+                self.remove_from_layer(obj)
+                self.add_to_layer(obj)
+            
+    def add_to_indexes(self, obj):
+        keys = [key for key in ('fighter', 'ai', 'item', 'equipment') if getattr(obj, key)]
+        if obj.name == 'open door' or obj.name == 'closed door':
+            keys.append('door')
+        elif obj.name == 'stairs':
+            keys.append('stairs')
+        elif obj.name.endswith(' Corpse'):
+            keys.append('corpse')
+            
+        self.keys_of[obj] = keys
+        for key in keys:
+            self.indexes[key][obj] = None
+            
+    def remove_from_indexes(self, obj):
+        for key in self.keys_of.pop(obj, ()):
+            del self.indexes[key][obj]
+            
+    def add_to_tile(self, obj, front):
+        tile = (obj.x, obj.y)
+        self.tile_of[obj] = tile
+        if front:
+            self.tiles.setdefault(tile, []).insert(0, obj)
+        else:
+            self.tiles.setdefault(tile, []).append(obj)
+        self.add_blocker(obj)
+            
+    def remove_from_tile(self, obj):
+        tile = self.tile_of.pop(obj, None)
+        if tile is not None:
+            here = self.tiles[tile]
+            here.remove(obj)
+            if not here:
+                del self.tiles[tile]
+        self.remove_blocker(obj)
+        
+    def add_blocker(self, obj):
+        if obj.blocks:
+            self.blockers[obj] = (obj.x, obj.y)
+            self.occupied[obj.x][obj.y] += 1
+            
+    def remove_blocker(self, obj):
+        tile = self.blockers.pop(obj, None)
+        if tile is not None:
+            self.occupied[tile[0]][tile[1]] -= 1
+            
+    def add_to_layer(self, obj):
+        self.layer_of[obj] = obj.layer
+        self.layers[obj.layer][obj] = None
+        
+    def remove_from_layer(self, obj):
+        layer = self.layer_of.pop(obj, None)
+        if layer is not None:
+            del self.layers[layer][obj]
 
         
-def DijkHeat(cmap, infov=False, limit=9):
+def DijkHeat(cmap, infov=False, limit=9, cells=None):
     #renders a heat map for a provided dijkstra(cmap)
     # if inFoV = true it will render the map within the players fov_map
     # otherwise it only renders outside of the fov_map
     # limit is what value the render stops at 
+    # cells is an optional list of (x, y) to limit the render to
     
     global map
     
-    for y in range (MAP_HEIGHT):
-        for x in range(MAP_WIDTH):
-            v = cmap.tiles[x][y]
-            if v == 1:
-                color = libtcod.darkest_azure
-            elif v == 2:
-                color = libtcod.darkest_sky 
-            elif v == 3:
-                color = libtcod.darker_azure
-            elif v == 4:
-                color = libtcod.darker_sky
-            elif v == 5:
-                color = libtcod.dark_azure
-            elif v == 6:
-                color = libtcod.dark_sky
-            elif v == 7:
-                color = libtcod.azure
-            elif v == 8:
-                color = libtcod.sky
-            elif v == 9:
-                color = libtcod.light_azure
-            elif v == 10:
-                color = libtcod.light_sky
-            elif v == 11:
-                color = libtcod.lighter_azure
-            elif v == 12:
-                color = libtcod.lighter_sky
-            elif v == 13:
-                color = libtcod.lightest_azure
-            elif v == 15:
-                color = libtcod.lightest_sky
-            else:
-                color = libtcod.white
+    if cells == None:
+        cells = camera_cells()
+    open_cells = get_open_lists()
+    
+    for (x, y) in cells:
+        v = cmap.cell_at(x, y)
+        if v == 1:
+            color = libtcod.darkest_azure
+        elif v == 2:
+            color = libtcod.darkest_sky 
+        elif v == 3:
+            color = libtcod.darker_azure
+        elif v == 4:
+            color = libtcod.darker_sky
+        elif v == 5:
+            color = libtcod.dark_azure
+        elif v == 6:
+            color = libtcod.dark_sky
+        elif v == 7:
+            color = libtcod.azure
+        elif v == 8:
+            color = libtcod.sky
+        elif v == 9:
+            color = libtcod.light_azure
+        elif v == 10:
+            color = libtcod.light_sky
+        elif v == 11:
+            color = libtcod.lighter_azure
+        elif v == 12:
+            color = libtcod.lighter_sky
+        elif v == 13:
+            color = libtcod.lightest_azure
+        elif v == 15:
+            color = libtcod.lightest_sky
+        else:
+            color = libtcod.white
 
-            if not v == 0:
-                render = False
-                if infov:
-                    if libtcod.map_is_in_fov(fov_map, x, y):
-                        render = True
+        if not v == 0:
+            render = False
+            if infov:
+                if libtcod.map_is_in_fov(fov_map, x, y):
+                    render = True
+            else:
+                if libtcod.map_is_in_fov(fov_map, x, y):
+                    render = False
                 else:
-                    if libtcod.map_is_in_fov(fov_map, x, y):
-                        render = False
-                    else:
-                        render = True
-                    
-                if render:
-                    if map[x][y].block_sight and map[x][y].is_door == False:
-                        pass
-                    elif v < limit:
-                        libtcod.console_set_char_background(0, x, y, color, libtcod.BKGND_SCREEN)
-                           
+                    render = True
+                
+            if render:
+                if not open_cells[y * MAP_WIDTH + x]:
+                    pass  #a wall
+                elif v < limit:
+                    set_screen_background(x, y, color, libtcod.BKGND_SCREEN)
+                       
 class DijkstraMap:
 
     # X, Y Transitions to the 8 neighboring cells
     neighbors = [(-1, -1), (0, -1), (1, -1),
                  (-1, 0), (1, 0),
                  (-1, 1), (0, 1), (1, 1)]
+    
+    # (width, height) -> neighbor offsets, shared by every map of that size
+    offset_tables = {}
 
-    def __init__(self, width, height):
+    def __init__(self, width, height, backend=None):
         """
         Create a Map  showing the movement score of various tiles
         :param int width: Map size in tiles
         :param int height: Map size in tiles
+        :param str backend: 'python' or 'numpy' (default: DIJKSTRA_BACKEND)
         """
+        if backend is None:
+            backend = DIJKSTRA_BACKEND
+        if backend == 'numpy' and numpy is None:
+            backend = 'python'
+            
         self.width = width
         self.height = height
+        self.backend = backend
         self.goals = []
-        self.tiles = []
+        self.tiles = []  #row-major, the score of x, y is tiles[y * width + x]
+        self.active = set()  #(x, y) cells above 0, kept up by map_sound and decay_map
+        self.offsets = self._get_offsets()
         self._clear_map()
+        
+        #settings of the last recalculation, used by move_goal
+        self.default = 9
+        self.doorstop = False
+        self.window = None
+        self.version = None
 
     def add_goal(self, x, y, score=0):
         """
@@ -430,48 +768,101 @@ class DijkstraMap:
         """
         
         self._clear_map(default)
-        changed = True
-        while changed:
-            changed = False
-            for y in range(0, self.height):
-                for x in range(0, self.width):
-                    if map[x][y].block_sight and map[x][y].is_door == False:
-                        #walls
-                        pass
-                    elif map[x][y].is_door and map[x][y].block_sight and doorstop:
-                        #if doorstop=True, a closed door will stop the progression
-                        pass
-                    else:
-                        lowest_neighbor = self._get_lowest_neighbor_value(x, y)
-                        if self.tiles[x][y] > lowest_neighbor + 1:
-                            self.tiles[x][y] = lowest_neighbor + 1
-                            changed = True
+        if self.backend == 'numpy':
+            self._propagate_numpy(default, doorstop)
+        else:
+            self._propagate(default, doorstop)
+            
+        (self.default, self.doorstop, self.window, self.version) = (default, doorstop, None, map_version)
     
     def recalculate_single(self, tx, ty, drange=9, doorstop=False):
         """
         rebuild dijkstra with only one goal..
         rebuilds only area around the goal in order to speed up processing time
         tx, ty = targetx, targety
+        cells outside the area (other than goals) are left exactly as they were,
+        so whatever an earlier call put there stays until something resets it
         """      
         
-        self._clear_map(drange)
-        changed = True
-        while changed:
-            changed = False
-            for y in range(0-drange, drange):
-                for x in range(0-drange, drange):
-                    if self.point_in_map(tx+x, ty+y):
-                        if map[tx+x][ty+y].block_sight and map[tx+x][ty+y].is_door == False:
-                            #walls stop the progression of a sound wave
-                            pass
-                        elif map[tx+x][ty+y].is_door and map[tx+x][ty+y].block_sight and doorstop:
-                            #if doorstop=True, a closed door will stop the progression of a sound wave
-                            pass
-                        else:
-                            lowest_neighbor = self._get_lowest_neighbor_value(tx+x, ty+y)
-                            if self.tiles[tx+x][ty+y] > lowest_neighbor + 1:
-                                self.tiles[tx+x][ty+y] = lowest_neighbor + 1
-                                changed = True
+        window = (tx-drange, ty-drange, tx+drange, ty+drange)
+        self._clear_rect(window, drange)
+        if self.backend == 'numpy':
+            self._propagate_numpy(drange, doorstop, window)
+        else:
+            self._propagate(drange, doorstop, window)
+            
+        (self.default, self.doorstop, self.window, self.version) = (drange, doorstop, window, map_version)
+    
+    def move_goal(self, x, y, new_x, new_y):
+        """
+        Move a goal to a new tile, only rebuilding the cells close enough to
+        either tile for their score to change. If there is no goal on x, y the
+        goals the map has are stale, so they're replaced by the one on new_x,
+        new_y and the map is rebuilt. Keeps the settings of the last recalculate_map or
+        recalculate_single call, a recalculate_single area moves along with
+        the goal. Walls or doors that changed since then get their
+        surroundings rebuilt too, or the whole map after a new level
+        :param int x: Current goal X coordinate
+        :param int y: Current goal Y coordinate
+        :param int new_x: New goal X coordinate
+        :param int new_y: New goal Y coordinate
+        """
+        moved = (x, y) != (new_x, new_y)
+        for (i, goal) in enumerate(self.goals):
+            if goal[0] == x and goal[1] == y:
+                score = goal[2]
+                self.goals[i] = (new_x, new_y, score)
+                break
+        else:
+            self.goals = [(new_x, new_y, 0)]
+            if self.window:
+                self._clear_rect(self.window, self.default)
+                self.recalculate_single(new_x, new_y, self.default, self.doorstop)
+            else:
+                self.recalculate_map(self.default, self.doorstop)
+            return
+
+        old_window = self.window
+        if old_window and moved:
+            (dx, dy) = (new_x - x, new_y - y)
+            self.window = (old_window[0]+dx, old_window[1]+dy, old_window[2]+dx, old_window[3]+dy)
+        
+        if self.window:
+            #the area itself moves, reset the old one and build the new one
+            if moved or self.version != map_version:
+                self._clear_rect(old_window, self.default)
+                self.recalculate_single(self.window[0] + self.default, self.window[1] + self.default, self.default, self.doorstop)
+        elif self.version != map_version:
+            changed = changed_since(self.version)
+            if changed is None:
+                #the old scores can't be trusted, start over
+                self.recalculate_map(self.default, self.doorstop)
+                return
+            #a way through a changed tile is at least as long as the way to it, so only the cells
+            #closer to it than the cap minus its lowest possible score can change. each changed
+            #tile (and each of the goal's tiles) gets a box of its own, merged only with boxes it
+            #overlaps or touches, since _patch trusts the cells around its window
+            cap = min(self.default, 101)
+            goals = self.goals + [(x, y, score)] if moved else self.goals
+            open_cells = get_open_lists(self.doorstop)
+            windows = []
+            for (cx, cy) in changed:
+                reach = cap - min(gscore + max(abs(cx - gx), abs(cy - gy)) for (gx, gy, gscore) in goals)
+                if reach > 0:
+                    windows.append((cx - reach, cy - reach, cx + reach + 1, cy + reach + 1))
+                else:
+                    #too far from every goal to score below the cap, before or after
+                    self.tiles[cy * self.width + cx] = cap if open_cells[cy * self.width + cx] else self.default
+            if moved:
+                reach = max(cap - score, 1)
+                windows += [(gx - reach, gy - reach, gx + reach + 1, gy + reach + 1) for (gx, gy) in ((x, y), (new_x, new_y))]
+            for window in self._merge_windows(windows):
+                self._patch(window)
+            self.version = map_version
+        elif moved:
+            #past reach of both tiles the goal's score is above the cap anyway, so nothing there changes
+            reach = max(min(self.default, 101) - score, 1)
+            self._patch((min(x, new_x) - reach, min(y, new_y) - reach, max(x, new_x) + reach + 1, max(y, new_y) + reach + 1))
     
     def get_move_options(self, x, y):
         """
@@ -480,11 +871,16 @@ class DijkstraMap:
         :param y: Entity Y Coordinate
         :return list: Recommended moves
         """
-        best = self._get_lowest_neighbor_value(x, y)
+        tiles = self.tiles
+        i = y * self.width + x
+        best = 100
         moves = []
-        for dx, dy in DijkstraMap.neighbors:
-            tx, ty = x + dx, y + dy
-            if self.point_in_map(tx, ty) and self.tiles[tx][ty] == best:
+        for (dx, dy, di) in self.neighbor_offsets(x, y):
+            v = tiles[i + di]
+            if v < best:
+                best = v
+                moves = [(dx, dy)]
+            elif v == best:
                 moves.append((dx, dy))
         return moves
 
@@ -497,18 +893,304 @@ class DijkstraMap:
         """
         return 0 <= x < self.width and 0 <= y < self.height
 
+    def neighbor_offsets(self, x, y):
+        """
+        The in-map neighbors of a cell, as (dx, dy, di) where di is the
+        step from the cell's index in tiles to the neighbor's
+        :param x: Cell X Coordinate
+        :param y: Cell Y Coordinate
+        :return tuple: (dx, dy, di) for each neighbor inside the map
+        """
+        return self.offsets[(x > 0) | (x < self.width - 1) << 1 | (y > 0) << 2 | (y < self.height - 1) << 3]
+
     def _clear_map(self, default=9):
         """
         Reset the map scores to an arbitrary value and populate goals
         :param int default: the initial value to set for each cell
         """
-        self.tiles = [
-            [default
-             for _ in range(self.height)]
-            for _ in range(self.width)]
+        if self.backend == 'numpy':
+            #reuse the same array instead of building a new grid every time
+            if isinstance(self.tiles, numpy.ndarray):
+                self.tiles.fill(default)
+            else:
+                self.tiles = numpy.full(self.width * self.height, default, dtype=numpy.int16)
+        else:
+            self.tiles = [default] * (self.width * self.height)
+
+        for (x, y, score) in self.goals:
+            self.tiles[y * self.width + x] = score
 
+    def _propagate(self, default=9, doorstop=False, window=None):
+        """
+        Spread the goal scores outward using a bucket queue, lowest score first.
+        Gives the same scores as sweeping the whole map until nothing changes,
+        but each cell is only visited when its score actually drops.
+        Expects _clear_map(default) to have been called first
+        :param int default: the value _clear_map reset the cells to
+        :param bool doorstop: whether closed doors stop the progression
+        :param tuple window: optional (x1, y1, x2, y2) area to limit the update to
+        """
+        tiles = self.tiles
+        width = self.width
+        open_cells = get_open_lists(doorstop)
+        
+        (x1, y1, x2, y2) = self._clip(window)
+        
+        #_get_lowest_neighbor_value never looks past 100, so open cells can't score above 101
+        cap = min(default, 101)
+        if cap < default:
+            for y in range(y1, y2):
+                for i in range(y * width + x1, y * width + x2):
+                    if tiles[i] > cap and open_cells[i]:
+                        tiles[i] = cap
+        
+        goal_cells = set()
         for (x, y, score) in self.goals:
-            self.tiles[x][y] = score
+            if self.point_in_map(x, y):
+                goal_cells.add(y * width + x)
+        
+        buckets = {}
+        for i in goal_cells:
+            (y, x) = divmod(i, width)
+            v = tiles[i]
+            if open_cells[i] and x1 <= x < x2 and y1 <= y < y2:
+                v = min(v, 101)
+                #a goal scored above its surroundings gets pulled down by its plain neighbors
+                for (dx, dy, di) in self.neighbor_offsets(x, y):
+                    if i + di not in goal_cells:
+                        if x1 <= x + dx < x2 and y1 <= y + dy < y2:
+                            v = min(v, tiles[i + di] + 1)
+                        else:
+                            #outside the window counts as reset, whatever was left there
+                            v = min(v, default + 1)
+                tiles[i] = v
+            buckets.setdefault(v, []).append(i)
+        
+        self._spread(buckets, doorstop, window)
+
+    def _spread(self, buckets, doorstop=False, window=None):
+        """
+        Bucket queue shared by _propagate and _patch: lowers the open neighbors
+        of each queued cell, lowest score first, queueing every cell it lowers
+        :param dict buckets: score -> list of cell indexes (y * width + x) to spread from
+        :param bool doorstop: whether closed doors stop the progression
+        :param tuple window: optional (x1, y1, x2, y2) area to limit the update to
+        """
+        tiles = self.tiles
+        offsets = self.offsets
+        width = self.width
+        (last_x, last_y) = (width - 1, self.height - 1)
+        open_cells = get_open_lists(doorstop)
+        (x1, y1, x2, y2) = self._clip(window)
+        
+        if not buckets:
+            return
+        
+        v = min(buckets)
+        while buckets:
+            frontier = buckets.pop(v, None)
+            if frontier:
+                nv = v + 1
+                for i in frontier:
+                    if tiles[i] != v:
+                        #already reached with a lower score
+                        continue
+                    (y, x) = divmod(i, width)
+                    #neighbor_offsets, inlined
+                    for (dx, dy, di) in offsets[(x > 0) | (x < last_x) << 1 | (y > 0) << 2 | (y < last_y) << 3]:
+                        n = i + di
+                        if tiles[n] > nv and open_cells[n] and x1 <= x + dx < x2 and y1 <= y + dy < y2:
+                            tiles[n] = nv
+                            buckets.setdefault(nv, []).append(n)
+            v += 1
+
+    def _patch(self, window):
+        """
+        Rebuild the scores inside a window after only goals inside it changed,
+        with the settings of the last recalculate_map. The cells around the
+        window keep their scores and spread back into it along with the goals,
+        so the window ends up the same as after a full recalculate_map
+        :param tuple window: (x1, y1, x2, y2) area to rebuild
+        """
+        (default, doorstop) = (self.default, self.doorstop)
+        tiles = self.tiles
+        width = self.width
+        (x1, y1, x2, y2) = self._clip(window)
+        cap = min(default, 101)
+        
+        #unlike _clear_rect, goals outside the window keep the score they have now
+        goal_cells = set()
+        goal_scores = {}
+        for (x, y, score) in self.goals:
+            goal_cells.add(y * width + x)
+            if x1 <= x < x2 and y1 <= y < y2:
+                goal_scores[y * width + x] = score
+        
+        if self.backend == 'numpy':
+            self._grid()[x1:x2, y1:y2] = default
+            for (i, score) in goal_scores.items():
+                tiles[i] = score
+            self._propagate_numpy(default, doorstop, window, True)
+            return
+        
+        open_cells = get_open_lists(doorstop)
+        if x1 < x2:
+            for y in range(y1, y2):
+                (start, end) = (y * width + x1, y * width + x2)
+                tiles[start:end] = [cap if is_open else default for is_open in open_cells[start:end]]
+        
+        buckets = {}
+        for (i, v) in goal_scores.items():
+            if open_cells[i]:
+                v = min(v, 101)
+                #pulled down by its plain neighbors, at the score they have before anything spreads
+                (y, x) = divmod(i, width)
+                for (dx, dy, di) in self.neighbor_offsets(x, y):
+                    if i + di not in goal_cells:
+                        v = min(v, (cap if open_cells[i + di] else default) + 1)
+            tiles[i] = v
+            buckets.setdefault(v, []).append(i)
+        
+        #the untouched ring around the window
+        ring = []
+        for x in range(max(x1 - 1, 0), min(x2 + 1, width)):
+            if y1 > 0:
+                ring.append((y1 - 1) * width + x)
+            if y2 < self.height:
+                ring.append(y2 * width + x)
+        for y in range(y1, y2):
+            if x1 > 0:
+                ring.append(y * width + x1 - 1)
+            if x2 < width:
+                ring.append(y * width + x2)
+        for i in ring:
+            buckets.setdefault(tiles[i], []).append(i)
+        
+        self._spread(buckets, doorstop, (x1, y1, x2, y2))
+
+    def _propagate_numpy(self, default=9, doorstop=False, window=None, keep_border=False):
+        """
+        Relax every open cell at once: each pass takes the lowest of the 8
+        shifted copies of the window, until a pass changes nothing.
+        Gives the same scores as _propagate
+        :param int default: the value the window was reset to
+        :param bool doorstop: whether closed doors stop the progression
+        :param tuple window: optional (x1, y1, x2, y2) area to limit the update to
+        :param bool keep_border: spread in from the scores around the window instead of default
+        """
+        (x1, y1, x2, y2) = self._clip(window)
+        (w, h) = (x2 - x1, y2 - y1)
+        if w <= 0 or h <= 0:
+            return
+        
+        walls, closed_doors = get_passability_masks()
+        open_cells = ~walls[x1:x2, y1:y2]
+        if doorstop:
+            open_cells &= ~closed_doors[x1:x2, y1:y2]
+        
+        tiles = self._grid()
+        
+        #the window plus a one cell border. off the map the border is 100, the same value
+        #_get_lowest_neighbor_value starts from, and on the map it counts as reset (or a goal)
+        padded = numpy.full((w + 2, h + 2), 100, dtype=tiles.dtype)
+        (bx1, by1, bx2, by2) = (max(x1-1, 0), max(y1-1, 0), min(x2+1, self.width), min(y2+1, self.height))
+        if keep_border:
+            padded[bx1-x1+1:bx2-x1+1, by1-y1+1:by2-y1+1] = tiles[bx1:bx2, by1:by2]
+        else:
+            padded[bx1-x1+1:bx2-x1+1, by1-y1+1:by2-y1+1] = default
+            for (gx, gy, score) in self.goals:
+                if x1-1 <= gx <= x2 and y1-1 <= gy <= y2 and self.point_in_map(gx, gy):
+                    padded[gx-x1+1, gy-y1+1] = score
+        inner = padded[1:-1, 1:-1]
+        inner[:] = tiles[x1:x2, y1:y2]
+        
+        lowest = numpy.empty((w, h), dtype=tiles.dtype)
+        while True:
+            lowest.fill(100)
+            for dx, dy in DijkstraMap.neighbors:
+                numpy.minimum(lowest, padded[1+dx:w+1+dx, 1+dy:h+1+dy], out=lowest)
+            lowest += 1
+            
+            changed = open_cells & (inner > lowest)
+            if not changed.any():
+                break
+            inner[changed] = lowest[changed]
+            
+        tiles[x1:x2, y1:y2] = inner
+
+    def _clip(self, window=None):
+        """
+        Clip a window to the map
+        :param tuple window: (x1, y1, x2, y2) area, or None for the whole map
+        :return tuple: (x1, y1, x2, y2) inside the map, x2/y2 exclusive
+        """
+        if window is None:
+            return (0, 0, self.width, self.height)
+        return (max(window[0], 0), max(window[1], 0), min(window[2], self.width), min(window[3], self.height))
+
+    def _merge_windows(self, windows):
+        """
+        Merge the windows that overlap or touch into their bounding box, until
+        none of the ones left do. Touching counts, so no window's border ring
+        lies inside another window
+        :param list windows: (x1, y1, x2, y2) areas
+        :return list: (x1, y1, x2, y2) areas that are at least one cell apart
+        """
+        merged = []
+        for window in windows:
+            while True:
+                for other in merged:
+                    if other[0] <= window[2] and window[0] <= other[2] and other[1] <= window[3] and window[1] <= other[3]:
+                        merged.remove(other)
+                        window = (min(window[0], other[0]), min(window[1], other[1]),
+                                  max(window[2], other[2]), max(window[3], other[3]))
+                        break
+                else:
+                    break
+            merged.append(window)
+        return merged
+
+    def _clear_rect(self, window, default=9):
+        """
+        Like _clear_map, but only resets the cells inside a window
+        :param tuple window: (x1, y1, x2, y2) area to reset
+        :param int default: the initial value to set for each cell
+        """
+        (x1, y1, x2, y2) = self._clip(window)
+        if self.backend == 'numpy':
+            self._grid()[x1:x2, y1:y2] = default
+        elif x1 < x2:
+            row = [default] * (x2 - x1)
+            for y in range(y1, y2):
+                self.tiles[y * self.width + x1:y * self.width + x2] = row
+                    
+        for (x, y, score) in self.goals:
+            if self.point_in_map(x, y):
+                self.tiles[y * self.width + x] = score
+
+    def _grid(self):
+        """
+        The numpy backend's tiles as a [x, y] view, for slicing windows out of them
+        :return numpy.ndarray: (width, height) view sharing the tiles' memory
+        """
+        return self.tiles.reshape(self.height, self.width).T
+
+    def _get_offsets(self):
+        """
+        Build (once per map size) the neighbor offsets of each border class: the
+        interior, the four edges and the four corners. Entry (x > 0) | (x < width - 1) << 1
+        | (y > 0) << 2 | (y < height - 1) << 3 holds the neighbors that stay in the map
+        :return tuple: 16 tuples of (dx, dy, di), see neighbor_offsets
+        """
+        key = (self.width, self.height)
+        if key not in DijkstraMap.offset_tables:
+            table = []
+            for border in range(16):
+                (left, right, up, down) = (border & 1, border & 2, border & 4, border & 8)
+                table.append(tuple((dx, dy, dy * self.width + dx) for dx, dy in DijkstraMap.neighbors
+                                   if (dx >= 0 or left) and (dx <= 0 or right) and (dy >= 0 or up) and (dy <= 0 or down)))
+            DijkstraMap.offset_tables[key] = tuple(table)
+        return DijkstraMap.offset_tables[key]
 
     def _get_lowest_neighbor_value(self, x, y):
         """
@@ -517,11 +1199,12 @@ class DijkstraMap:
         :param y: Current Y Coordinate
         :return int: Lowest neighboring value
         """
+        tiles = self.tiles
+        i = y * self.width + x
         lowest = 100
-        for dx, dy in DijkstraMap.neighbors:
-            tx, ty = x + dx, y + dy
-            if self.point_in_map(tx, ty):
-                lowest = min(lowest, self.tiles[tx][ty])
+        for (dx, dy, di) in self.neighbor_offsets(x, y):
+            if tiles[i + di] < lowest:
+                lowest = tiles[i + di]
         return lowest
 
     def __repr__(self):
@@ -532,16 +1215,20 @@ class DijkstraMap:
         out = ""
         for y in range(0, self.height):
             for x in range(0, self.width):
-                out += str(hex(self.tiles[x][y])[2:])
+                out += str(hex(int(self.tiles[y * self.width + x]))[2:])
             out += "\n"
         return out
  
     def cell_at(self, x, y):
-        return self.tiles[x][y]
+        return self.tiles[y * self.width + x]
         
         
-class Fighter:
+class Fighter(object):
     #combat-related properties and methods (monster, player, NPC).
+    __slots__ = ('owner', 'base_max_hp', 'hp', 'base_ac', 'base_strength', 'base_dexterity', 'base_luck',
+                 'base_damage', 'xp', 'currency', 'base_speed', 'atk_sound', 'hit_sound', 'death_sound',
+                 'death_function', 'loot')
+    
     def __init__(self, hp, ac, strength, dexterity, luck, damage, speed, xp, currency=None, 
                 atk_sound=None, hit_sound=None, death_sound=None, death_function=None):
         self.base_max_hp = hp
@@ -553,13 +1240,13 @@ class Fighter:
         self.base_damage = damage
         self.xp = xp
         self.currency = currency
-        self.counter = 0
         self.base_speed = speed
         self.atk_sound = atk_sound
         self.hit_sound = hit_sound
         self.death_sound = death_sound
         self.death_function = death_function
         self.loot = [] #stores loot for monster drops
+        self.owner = None
  
     @property
     def strength(self):  #return actual strength, by summing up the bonuses from all equipped items
@@ -591,10 +1278,6 @@ class Fighter:
         bonus = sum(equipment.max_hp_bonus for equipment in get_all_equipped(self.owner))
         return self.base_max_hp + bonus
  
-    @property
-    def currency(self):  #return player currency
-        return self.currency
- 
     @property
     def damage(self):  #return actual damage for combat damage
         bonus = sum(equipment.damage_bonus for equipment in get_all_equipped(self.owner))
@@ -702,6 +1385,9 @@ class Fighter:
 
 class BasicMonster:
     #AI for a basic monster.
+    awake = False  #sleeping monsters skip their turns, see monster_awake()
+    quiet_turns = 0  #turns in a row the player went unnoticed while awake
+    
     def take_turn(self):
         #a basic monster takes its turn. if you can see it, it can see you
         monster = self.owner
@@ -709,7 +1395,13 @@ class BasicMonster:
         
         n = libtcod.random_get_int(0, 1, 5)
         if monster.distance_to(player) >= 2:        # if you can't sense that mf
-            monster.move_dijkstra(player_dijkstra)                 #   move.
+            step = None
+            if player_dijkstra.cell_at(monster.x, monster.y) >= player_dijkstra.default:
+                step = scent_gradient(monster.x, monster.y)     #   out of the dijkstra's reach, sniff around
+            if step and not is_blocked(monster.x + step[0], monster.y + step[1]):
+                monster.move(step[0], step[1])      #   follow its scent if there is one,
+            else:
+                monster.move_dijkstra(player_dijkstra)                 #   otherwise move (and deal with doors).
         elif player.fighter.hp > 0:                 # otherwise, if that mf is still alive
             if n > 4:
                 monster.move_dijkstra(player_dijkstra)
@@ -731,11 +1423,89 @@ class ConfusedMonster:
         else:  #restore the previous AI (this one will be deleted because it's not referenced anymore)
             self.owner.ai = self.old_ai
             message('The ' + self.owner.name + ' is no longer confused!', libtcod.red)
+ 
+class TurnScheduler:
+    #decides who acts when. a priority queue of [time of next action, order added, object], with
+    #time counted in ticks: a player turn is self.ticks ticks, and something with speed s acts every
+    #ticks * player speed / s of them. speeds count in tenths and ticks stays a multiple of every
+    #speed in use, so the times are whole numbers and speeds like 2.8 and 2.5 keep their pacing forever
+    def __init__(self):
+        self.time = 0
+        self.ticks = 1
+        self.queue = []
+        self.entries = {}  #object -> its entry in the queue
+        self.added = 0
+        self.player_speed = None  #in tenths, as of the last turn
+        self.intervals = {}  #speed in tenths -> ticks between two actions, for the current player speed
+        
+    def add(self, actor):
+        #start scheduling an actor (on spawn), its first action comes one interval from now
+        self.remove(actor)
+        interval = self.interval(actor)
+        self.push(actor, self.time + interval)
+        
+    def remove(self, actor):
+        #stop scheduling an actor (on death). its entry stays in the queue, but gets skipped
+        entry = self.entries.pop(actor, None)
+        if entry:
+            entry[2] = None
+            
+    def push(self, actor, time):
+        entry = [time, self.added, actor]
+        self.added += 1
+        self.entries[actor] = entry
+        heapq.heappush(self.queue, entry)
+        
+    def interval(self, actor):
+        #ticks between two actions of actor, worked out once per speed
+        speed = int(round(actor.fighter.speed * 10))
+        interval = self.intervals.get(speed)
+        if interval is None:
+            if self.player_speed is None:
+                self.player_speed = int(round(player.fighter.speed * 10))
+            if self.ticks % speed:
+                self.rescale(speed // fractions.gcd(self.ticks, speed))
+            interval = self.intervals[speed] = self.ticks // speed * self.player_speed
+        return interval
+        
+    def rescale(self, factor):
+        #make every tick factor ticks, for a speed ticks isn't a multiple of yet. the order stays the same
+        self.time *= factor
+        self.ticks *= factor
+        for entry in self.queue:
+            entry[0] *= factor
+        self.intervals = {}
+        
+    def next_turn(self):
+        #advance one player turn, yielding every actor whose time has come (as often as it's due,
+        #in order). only those actors are touched, the rest of the queue just waits
+        speed = int(round(player.fighter.speed * 10))
+        if speed != self.player_speed:
+            (self.player_speed, self.intervals) = (speed, {})
+        
+        self.time += self.ticks
+        while self.queue and self.queue[0][0] <= self.time:
+            entry = heapq.heappop(self.queue)
+            actor = entry[2]
+            if actor is None:
+                continue  #removed
+            if actor.ai is None or actor.fighter is None:
+                del self.entries[actor]
+                continue
+            
+            yield actor
+            
+            if self.entries.get(actor) is entry:  #still scheduled after its action
+                ticks = self.ticks
+                interval = self.interval(actor)
+                #a new speed can rescale the queue, which this entry is out of for now
+                self.push(actor, entry[0] * (self.ticks // ticks) + interval)
 
 
             
-class Item:
+class Item(object):
     #an item that can be picked up and/or used.
+    __slots__ = ('owner', 'stacks', 'count', 'use_function', 'pickup_sound', 'use_sound')
    
     def __init__(self, stacks=False, count=1, use_function=None, pickup_sound=None, use_sound=None):
         self.stacks = stacks
@@ -743,6 +1513,7 @@ class Item:
         self.use_function = use_function
         self.pickup_sound = pickup_sound
         self.use_sound = use_sound
+        self.owner = None
         
     def pick_up(self):
         
@@ -808,10 +1579,10 @@ class Item:
             self.owner.equipment.dequip()
  
         #add to the map and remove from the player's inventory. also, place it at the player's coordinates
-        objects.append(self.owner)
         inventory.remove(self.owner)
         self.owner.x = player.x
         self.owner.y = player.y
+        objects.append(self.owner)
         message('You dropped a ' + self.owner.name + '.', libtcod.yellow)
         #play pickup sound if applicable
         if self.pickup_sound:
@@ -847,8 +1618,11 @@ class Item:
                 else:  
                     inventory.remove(self.owner)  #destroy after use, unless it was cancelled for some reason
  
-class Equipment:
+class Equipment(object):
     #an object that can be equipped, yielding bonuses. automatically adds the Item component.
+    __slots__ = ('owner', 'strength_bonus', 'dexterity_bonus', 'luck_bonus', 'speed_bonus', 'tohit_bonus',
+                 'damage_bonus', 'ac_bonus', 'max_hp_bonus', 'shotrange', 'range_damage', 'slot', 'is_equipped')
+    
     def __init__(self, slot, strength_bonus=0, dexterity_bonus=0, luck_bonus=0, speed_bonus=0, tohit_bonus=0, damage_bonus=0, ac_bonus=0, max_hp_bonus=0, shotrange=None, range_damage=0):
         self.strength_bonus = strength_bonus
         self.dexterity_bonus = dexterity_bonus
@@ -862,6 +1636,7 @@ class Equipment:
         self.range_damage = range_damage
         self.slot = slot
         self.is_equipped = False
+        self.owner = None
  
     def toggle_equip(self):  #toggle equip/dequip status
         if self.is_equipped:
@@ -885,35 +1660,272 @@ class Equipment:
         self.is_equipped = False
         message('Dequipped ' + self.owner.name + ' from ' + self.slot + '.', libtcod.light_yellow)
         
-def map_sound(sourcex, sourcey, intensity=15): 
-
-    sound_dijkstra.clear_goals()
-    sound_dijkstra._clear_map(intensity)
-    sound_dijkstra.add_goal(sourcex, sourcey)
-    sound_dijkstra.recalculate_single(sourcex, sourcey, intensity, True)
+def passability_changed(cells=None):
+    #walls or doors changed, so anything built from the old layout has to catch up.
+    #cells lists the (x, y) tiles that changed, None means the whole map did
+    global map_version, map_rebuilt, map_changes
+    map_version += 1
+    
+    if cells is None:
+        (map_rebuilt, map_changes) = (map_version, [])
+    else:
+        map_changes.extend((map_version, x, y) for (x, y) in cells)
+        
+def changed_since(version):
+    #the (x, y) tiles changed after map_version version, or None if the whole map has to be redone
+    if version is None or version < map_rebuilt:
+        return None
+    return [(x, y) for (changed, x, y) in map_changes if changed > version]
+
+def get_passability_masks():
+    #returns (walls, closed_doors) as numpy bool arrays indexed [x][y]. built once per level,
+    #after a door changes only its tile is redone
+    global passability_cache
+    
+    changed = None
+    if passability_cache is not None:
+        if passability_cache[0] == map_version:
+            return passability_cache[1], passability_cache[2]
+        changed = changed_since(passability_cache[0])
+        
+    if changed is None:
+        walls = map.block_sight & ~map.is_door
+        closed_doors = map.block_sight & map.is_door
+        passability_cache = [map_version, walls, closed_doors]
+    else:
+        (walls, closed_doors) = (passability_cache[1], passability_cache[2])
+        for (x, y) in changed:
+            (block_sight, is_door) = (map.block_sight[x, y], map.is_door[x, y])
+            walls[x, y] = block_sight and not is_door
+            closed_doors[x, y] = block_sight and is_door
+        passability_cache[0] = map_version
+        
+    return walls, closed_doors
+        
+def get_open_lists(doorstop=False):
+    #returns flat row-major lists, like DijkstraMap.tiles (y * MAP_WIDTH + x), True where an ai map's score can be lowered: anything
+    #but walls (and closed doors, with doorstop). after a door changes only its tile is redone
+    global open_lists
+    
+    changed = None
+    if open_lists is not None:
+        if open_lists[0] == map_version:
+            return open_lists[1][doorstop]
+        changed = changed_since(open_lists[0])
+        
+    if changed is None:
+        block_sight = map.as_lists('block_sight')
+        is_door = map.as_lists('is_door')
+        cells = [(block_sight[x][y], is_door[x][y]) for y in range(MAP_HEIGHT) for x in range(MAP_WIDTH)]
+        open_lists = [None, {
+            False: [not blocks or door for (blocks, door) in cells],
+            True: [not blocks for (blocks, door) in cells]}]
+    else:
+        for (x, y) in changed:
+            blocks = map.block_sight[x, y]
+            open_lists[1][False][y * MAP_WIDTH + x] = bool(not blocks or map.is_door[x, y])
+            open_lists[1][True][y * MAP_WIDTH + x] = bool(not blocks)
+    open_lists[0] = map_version
     
-    #invert the whole map
-    for y in range(MAP_HEIGHT):
-        for x in range(MAP_WIDTH):
-            sound_dijkstra.tiles[x][y] = intensity - sound_dijkstra.tiles[x][y]
+    return open_lists[1][doorstop]
+        
+def cached_dijkstra(goals, default=9, doorstop=False):
+    #returns a DijkstraMap for a list of (x, y, score) goals, reusing an earlier one when the
+    #goals, range, doorstop flag and map_version all match. the map is shared, so don't change it
+    key = (tuple(sorted(goals)), default, doorstop, map_version)
+    
+    dmap = dijkstra_cache.pop(key, None)
+    if dmap is None:
+        dmap = DijkstraMap(MAP_WIDTH, MAP_HEIGHT)
+        for (x, y, score) in key[0]:
+            dmap.add_goal(x, y, score)
+        dmap.recalculate_map(default, doorstop)
+        
+        #maps from before the walls or doors last changed will never be asked for again
+        for old_key in dijkstra_cache.keys():
+            if old_key[3] != map_version:
+                del dijkstra_cache[old_key]
+        while len(dijkstra_cache) >= DIJKSTRA_CACHE_SIZE:
+            dijkstra_cache.popitem(last=False)  #drop the least recently used
+            
+    dijkstra_cache[key] = dmap
+    return dmap
+    
+def new_scent_map():
+    #an empty scent layer, or None without numpy
+    global scent_steps, scent_box
+    (scent_steps, scent_box) = (None, None)
+    if numpy is None:
+        return None
+    return numpy.zeros((MAP_WIDTH, MAP_HEIGHT), dtype=numpy.float32)
+    
+def deposit_scent(x, y, amount=SCENT_STRENGTH):
+    #leave scent on a cell, topping it up to amount
+    global scent_box
+    if scent_map is not None:
+        scent_map[x, y] = max(scent_map[x, y], amount)
+        if scent_box is None:
+            scent_box = (x, y, x, y)
+        else:
+            scent_box = (min(scent_box[0], x), min(scent_box[1], y), max(scent_box[2], x), max(scent_box[3], y))
+    
+def spread_scent():
+    #once a turn: every open cell mixes with the average of its open neighborhood, then
+    #evaporates. walls and closed doors hold no scent and don't pass it on.
+    #afterwards works out, for every cell, which neighbor smells strongest.
+    #only the cells around scent_box are touched: scent moves one cell a turn, and the cells
+    #next to those need their steps worked out, so a border of 2 covers everything that can change
+    global scent_steps, scent_box
+    
+    if scent_map is None:
+        return
+    if scent_steps is None:
+        scent_steps = numpy.empty(scent_map.shape, dtype=numpy.int8)
+        scent_steps.fill(-1)
+    if scent_box is None:
+        return
+    
+    (x0, y0) = (max(scent_box[0] - 2, 0), max(scent_box[1] - 2, 0))
+    (x1, y1) = (min(scent_box[2] + 3, scent_map.shape[0]), min(scent_box[3] + 3, scent_map.shape[1]))
+    walls, closed_doors = get_passability_masks()
+    open_cells = ~(walls[x0:x1, y0:y1] | closed_doors[x0:x1, y0:y1])
+    (w, h) = open_cells.shape
+    
+    padded = numpy.zeros((w + 2, h + 2), dtype=scent_map.dtype)
+    padded_open = numpy.zeros((w + 2, h + 2), dtype=scent_map.dtype)
+    padded[1:-1, 1:-1] = numpy.where(open_cells, scent_map[x0:x1, y0:y1], 0)
+    padded_open[1:-1, 1:-1] = open_cells
+    
+    total = numpy.zeros((w, h), dtype=scent_map.dtype)
+    count = numpy.zeros((w, h), dtype=scent_map.dtype)
+    for dx in (-1, 0, 1):
+        for dy in (-1, 0, 1):
+            total += padded[1+dx:w+1+dx, 1+dy:h+1+dy]
+            count += padded_open[1+dx:w+1+dx, 1+dy:h+1+dy]
+    average = total / numpy.maximum(count, 1)
+    
+    scent = (1 - SCENT_DIFFUSION) * padded[1:-1, 1:-1] + SCENT_DIFFUSION * average
+    scent *= 1 - SCENT_EVAPORATION
+    scent[~open_cells | (scent < SCENT_MIN)] = 0
+    scent_map[x0:x1, y0:y1] = scent
+    
+    #index into DijkstraMap.neighbors of the strongest neighbor, or -1 if none beats the cell itself
+    padded[1:-1, 1:-1] = scent
+    around = numpy.array([padded[1+dx:w+1+dx, 1+dy:h+1+dy] for dx, dy in DijkstraMap.neighbors])
+    best = around.argmax(axis=0)
+    stronger = around.max(axis=0) > scent
+    scent_steps[x0:x1, y0:y1] = numpy.where(stronger, best, -1)
+    
+    (xs, ys) = numpy.nonzero(scent)
+    if len(xs):
+        scent_box = (x0 + xs.min(), y0 + ys.min(), x0 + xs.max(), y0 + ys.max())
+    else:
+        scent_box = None
+    
+def scent_gradient(x, y):
+    #(dx, dy) towards the strongest scent next to (x, y), or None if there's no trail to follow
+    if scent_steps is None:
+        return None
+    i = scent_steps[x, y]
+    if i < 0:
+        return None
+    return DijkstraMap.neighbors[i]
+    
+def monster_awake(monster):
+    #whether a monster gets its turn. a basic monster wakes up when the player is close on the
+    #player dijkstra, in FOV or loud enough on the sound map, and goes back to sleep after
+    #SLEEP_AFTER turns without any of those. other AIs (like a confused monster) are always awake
+    ai = monster.ai
+    if not isinstance(ai, BasicMonster):
+        return True
+    
+    (x, y) = (monster.x, monster.y)
+    noticed = (player_dijkstra.cell_at(x, y) <= WAKE_DISTANCE or sound_dijkstra.cell_at(x, y) >= WAKE_SOUND
+               or libtcod.map_is_in_fov(fov_map, x, y))
+    if noticed:
+        (ai.awake, ai.quiet_turns) = (True, 0)
+    elif ai.awake:
+        ai.quiet_turns += 1
+        if ai.quiet_turns >= SLEEP_AFTER:
+            ai.awake = False
+    return ai.awake
+    
+def dormant_turn(monster):
+    #a sleeping monster's whole turn: now and then a random step, no maps involved
+    if DORMANT_MOVE_CHANCE and libtcod.random_get_int(0, 1, DORMANT_MOVE_CHANCE) == 1:
+        (dx, dy) = random.choice(DijkstraMap.neighbors)
+        monster.move(dx, dy)
+    
+def map_sound(sourcex, sourcey, intensity=15): 
+    map_sounds([(sourcex, sourcey, intensity)])
+    
+def map_sounds(sources):
+    #spreads a list of (x, y, intensity) sounds into sound_dijkstra, losing 1 per step and stopped
+    #by walls and closed doors. every cell keeps the loudest sound that reaches it, so sounds in the
+    #same turn add up instead of wiping each other out. a wavefront stops wherever the map is already
+    #at least as loud, so overlapping sounds cost little extra. nothing is cleared either: older
+    #sound, near or far, only goes away through decay_map
+    tiles = sound_dijkstra.tiles
+    active = sound_dijkstra.active  #cells with sound in them, for decay_map
+    offsets = sound_dijkstra.offsets
+    width = sound_dijkstra.width
+    (last_x, last_y) = (width - 1, sound_dijkstra.height - 1)
+    open_cells = get_open_lists(True)
+    
+    #loudest first, so the quieter ones mostly stop early
+    for (sourcex, sourcey, intensity) in sorted(sources, key=lambda source: -source[2]):
+        if tiles[sourcey * width + sourcex] >= intensity:
+            continue
+        tiles[sourcey * width + sourcex] = intensity
+        active.add((sourcex, sourcey))
+        
+        frontier = [(sourcex, sourcey)]
+        v = intensity - 1
+        while frontier and v > 0:
+            next_frontier = []
+            for (x, y) in frontier:
+                i = y * width + x
+                for (dx, dy, di) in offsets[(x > 0) | (x < last_x) << 1 | (y > 0) << 2 | (y < last_y) << 3]:
+                    if tiles[i + di] < v and open_cells[i + di]:
+                        tiles[i + di] = v
+                        active.add((x + dx, y + dy))
+                        next_frontier.append((x + dx, y + dy))
+            frontier = next_frontier
+            v -= 1
+    
+def queue_sound(sourcex, sourcey, intensity=15):
+    #make a sound this turn, it spreads along with the other sounds made before the monsters act
+    #(or while they do) in apply_turn_events()
+    turn_sounds.append((sourcex, sourcey, intensity))
+    
+def apply_turn_events():
+    #spreads all the sounds queued this turn in one go
+    global turn_sounds
+    
+    if turn_sounds:
+        (sounds, turn_sounds) = (turn_sounds, [])
+        map_sounds(sounds)
     
 def decay_map(map, decayrate = 1):
+    #decays the map's active cells toward 0, dropping them from the set once they get there,
+    #so a quiet map costs nothing. returns True if any cell still has something left
     
     if map == None:
         map = sound_dijkstra
+    tiles = map.tiles
+    width = map.width
     
-    changes = True
-    
-    while changes:
-        for y in range(MAP_HEIGHT): 
-            for x in range(MAP_WIDTH):
-                changes = False
-                if map.tiles[x][y] > 0:
-                    map.tiles[x][y] = map.tiles[x][y] - decayrate
-                    if map.tiles[x][y] < 0:
-                        map.tiles[x][y] = 0
-                        changes = True
+    for (x, y) in list(map.active):
+        v = tiles[y * width + x] - decayrate
+        if v > 0:
+            tiles[y * width + x] = v
+        else:
+            tiles[y * width + x] = 0
+            map.active.discard((x, y))
                         
+    return len(map.active) > 0
+                        
+
 def choose_ranged():
     
     wepchoice = None
@@ -1014,14 +2026,11 @@ def fire_ranged(shotrange=5, damage=1, ammo=None):
                 if map[player.x][y].block_sight:
                     break    
                     
-                for obj in objects:
-                    if obj == player:
-                        pass
-                    elif obj.fighter:
-                       if obj.x == player.x and obj.y == y:
-                            #found a fighter target
-                            target = obj
-                            break
+                for obj in objects.at(player.x, y):
+                    if obj.fighter and obj != player:
+                        #found a fighter target
+                        target = obj
+                        break
                             
                 #keep track of last position to drop ammo            
                 (lastx, lasty) = (player.x, y) 
@@ -1035,14 +2044,11 @@ def fire_ranged(shotrange=5, damage=1, ammo=None):
                 if map[x][player.y].block_sight:
                     break
                     
-                for obj in objects:
-                    if obj == player:
-                        pass
-                    elif obj.fighter:
-                       if obj.x == x and obj.y == player.y:
-                            #found a fighter target
-                            target = obj
-                            break
+                for obj in objects.at(x, player.y):
+                    if obj.fighter and obj != player:
+                        #found a fighter target
+                        target = obj
+                        break
                             
                 #keep track of last position to drop ammo            
                 (lastx, lasty) = (x, player.y)            
@@ -1060,14 +2066,11 @@ def fire_ranged(shotrange=5, damage=1, ammo=None):
                 if map[tx][ty].block_sight:
                     break
                 
-                for obj in objects:
-                    if obj == player:
-                        pass
-                    elif obj.fighter:
-                       if obj.x == tx and obj.y == ty:
-                            #found a fighter target
-                            target = obj
-                            break
+                for obj in objects.at(tx, ty):
+                    if obj.fighter and obj != player:
+                        #found a fighter target
+                        target = obj
+                        break
                             
                 #keep track of last position to drop ammo            
                 (lastx, lasty) = (tx, ty)               
@@ -1086,11 +2089,10 @@ def fire_ranged(shotrange=5, damage=1, ammo=None):
         
     
             added = False
-            for obj in objects:
-                if obj.name == ammo and obj.x == lastx and obj.y == lasty:
+            for obj in objects.at(lastx, lasty):
+                if obj.name == ammo and obj.item:
                     #add to existing ammo pile
                     obj.item.count = obj.item.count + 1
-                    obj.send_to_back
                     added = True
                     
             if not added:
@@ -1119,12 +2121,11 @@ def in_map_range(x, y):
 
 def tile_blocked(x, y):
     blocked = False
-    for obj in objects:
-        if obj.x == x and obj.y == y:
-            if obj.name == 'closed door' or obj.name == 'open door':
-                pass
-            else:
-                blocked = True
+    for obj in objects.at(x, y):
+        if obj.name == 'closed door' or obj.name == 'open door':
+            pass
+        else:
+            blocked = True
     return blocked
 
     
@@ -1198,15 +2199,11 @@ def Play_BGM(path):
         
 def is_blocked(x, y):
     #first test the map tile
-    if map[x][y].blocked:
+    if map.blocked[x, y]:
         return True
  
     #now check for any blocking objects
-    for object in objects:
-        if object.blocks and object.x == x and object.y == y:
-            return True
- 
-    return False
+    return objects.occupied[x][y] > 0
  
 def create_room(room):
     global map
@@ -1231,15 +2228,15 @@ def create_v_tunnel(y1, y2, x):
         map[x][y].block_sight = False
  
 def make_map():
-    global map, objects, stairs, gold_dijkstra
+    global map, objects, stairs, gold_dijkstra, scheduler, doors
  
     #the list of objects with just the player
-    objects = [player]
+    objects = ObjectList([player])
+    doors = {}
+    scheduler = TurnScheduler()
  
     #fill map with "blocked" tiles
-    map = [[ Tile(True)
-             for y in range(MAP_HEIGHT) ]
-           for x in range(MAP_WIDTH) ]
+    map = TileMap(MAP_WIDTH, MAP_HEIGHT)
  
     rooms = []
     num_rooms = 0
@@ -1275,6 +2272,7 @@ def make_map():
                 #this is the first room, where the player starts at
                 player.x = new_x
                 player.y = new_y
+                objects.relocate(player)
             else:
                 #all rooms after the first:
                 #connect it to the previous room with a tunnel
@@ -1300,24 +2298,21 @@ def make_map():
             num_rooms += 1
  
     #create stairs at the center of the last room
-    stairs = Object(new_x, new_y, '<', 'stairs', libtcod.white, always_visible=True)
+    stairs = Object(new_x, new_y, '<', 'stairs', libtcod.white, always_visible=True, layer=LAYER_FEATURE)  #drawn below the monsters
     objects.append(stairs)
-    stairs.send_to_back()  #so it's drawn below the monsters
     
     #build dijkstra maps for ai
-    gold_dijkstra = DijkstraMap(MAP_WIDTH, MAP_HEIGHT)
-    for obj in objects:
-        if obj.name == "gold":
-            gold_dijkstra.add_goal(obj.x, obj.y)
-            
-    gold_dijkstra.recalculate_map()
+    passability_changed()
+    gold_dijkstra = cached_dijkstra([(obj.x, obj.y, 0) for obj in objects.having('item') if obj.name == "gold"])
 
 def make_bsp():
-    global map, objects, stairs, bsp_rooms
+    global map, objects, stairs, bsp_rooms, scheduler, doors
  
-    objects = [player]
+    objects = ObjectList([player])
+    doors = {}
+    scheduler = TurnScheduler()
  
-    map = [[Tile(True) for y in range(MAP_HEIGHT)] for x in range(MAP_WIDTH)]
+    map = TileMap(MAP_WIDTH, MAP_HEIGHT)
  
     #Empty global list for storing room coordinates
     bsp_rooms = []
@@ -1334,15 +2329,15 @@ def make_bsp():
     #Random room for the stairs
     stairs_location = random.choice(bsp_rooms)
     bsp_rooms.remove(stairs_location)
-    stairs = Object(stairs_location[0], stairs_location[1], '<', 'stairs', libtcod.white, always_visible=True)
+    stairs = Object(stairs_location[0], stairs_location[1], '<', 'stairs', libtcod.white, always_visible=True, layer=LAYER_FEATURE)
     objects.append(stairs)
-    stairs.send_to_back()
  
     #Random room for player start
     player_room = random.choice(bsp_rooms)
     bsp_rooms.remove(player_room)
     player.x = player_room[0]
     player.y = player_room[1]
+    objects.relocate(player)
  
     #try 100 times to make doors
     for attempts in range(0, 500):
@@ -1479,9 +2474,10 @@ def make_door(x, y):
                     #create a door object,
                     #print "t ... door at : " + str(x) + "," + str(y)
                     item_component = Item(use_function=use_door, pickup_sound=None, use_sound=SFX_DOOR)
-                    item = Object(x, y, '+', 'closed door', libtcod.white, item=item_component)
+                    item = Object(x, y, '+', 'closed door', libtcod.white, item=item_component, layer=LAYER_FEATURE)
                       
                     objects.append(item)
+                    doors[(x, y)] = item
                 
                     map[x][y].block_sight = True
                     map[x][y].is_door = True
@@ -1535,75 +2531,68 @@ def try_kick():
             break
                      
     if not (dx, dy) == (None,  None):    
-        found = False
-        for obj in objects:
-            if found:
-                break
-                
-            if obj.x == player.x+dx and obj.y == player.y+dy:
-                found = True
-                
-                if obj.name == 'closed door':
-                    #try to kick down a closed door
-                    chance_break_door = 0
-                    for diceroll in range(1, 4):
-                        chance_break_door = chance_break_door + libtcod.random_get_int(0, 1, 6) 
-                        print str(chance_break_door)
-                    
-                    chance_break_door = chance_break_door + player.fighter.modifier(player.fighter.strength)
+        #kick the door if there is one, otherwise the first thing on that tile
+        here = objects.at(player.x+dx, player.y+dy)
+        found = len(here) > 0
+        if found:
+            obj = doors.get((player.x+dx, player.y+dy), here[0])
+            
+            if obj.name == 'closed door':
+                #try to kick down a closed door
+                chance_break_door = 0
+                for diceroll in range(1, 4):
+                    chance_break_door = chance_break_door + libtcod.random_get_int(0, 1, 6) 
                     print str(chance_break_door)
-                        
-                    bd_check = 14
+                
+                chance_break_door = chance_break_door + player.fighter.modifier(player.fighter.strength)
+                print str(chance_break_door)
                     
-                    if chance_break_door >= bd_check:  
-                        #kick chance successful
-                        obj.name = 'open door'
-                        obj.char = '-'
-                        map[obj.x][obj.y].block_sight = False
-                        map[obj.x][obj.y].blocked = False
-                        message("The door crashes open!", libtcod.light_orange)
-                        Play_BGSFX(SFX_DOORBREAK)
-                        map_sound(obj.x, obj.y, 15)
-                        fov_recompute = True
-                        initialize_fov()
-                                
-                    else:                  
-                        #print "knock knock"
-                        message("The door shakes but is still closed.",libtcod.white)
-                        Play_BGSFX(SFX_DOORSHAKE)
+                bd_check = 14
+                
+                if chance_break_door >= bd_check:  
+                    #kick chance successful
+                    set_door(obj.x, obj.y, True)
+                    message("The door crashes open!", libtcod.light_orange)
+                    Play_BGSFX(SFX_DOORBREAK)
+                    queue_sound(obj.x, obj.y, 15)
                             
-                elif obj.name == 'open door':
-                    #goof around with open door.. returns cancelled to not take up turn
-                    message("Your foot flies awkwardly through the open doorway.")
-                    return 'cancelled'
-                    
-                elif obj.name == 'stairs':
-                        message('You kick the stairs and manage to mess up your toe pretty badly.', libtcod.gray)
-                        player.fighter.take_damage(3)
+                else:                  
+                    #print "knock knock"
+                    message("The door shakes but is still closed.",libtcod.white)
+                    Play_BGSFX(SFX_DOORSHAKE)
                         
-                else:
+            elif obj.name == 'open door':
+                #goof around with open door.. returns cancelled to not take up turn
+                message("Your foot flies awkwardly through the open doorway.")
+                return 'cancelled'
+                
+            elif obj.name == 'stairs':
+                    message('You kick the stairs and manage to mess up your toe pretty badly.', libtcod.gray)
+                    player.fighter.take_damage(3)
                     
-                    if obj.fighter:
-                            message('The ' + obj.name + ' dodges your kick.', libtcod.gray)
+            else:
+                
+                if obj.fighter:
+                        message('The ' + obj.name + ' dodges your kick.', libtcod.gray)
+                
+                elif (map[obj.x+dx][obj.y+dy].block_sight and map[obj.x+dx][obj.y+dy].is_door == False) or map[obj.x+dx][obj.y+dy].blocked:
+                    message('You kick the ' + obj.name +', but it does not budge.', libtcod.gray)
                     
-                    elif (map[obj.x+dx][obj.y+dy].block_sight and map[obj.x+dx][obj.y+dy].is_door == False) or map[obj.x+dx][obj.y+dy].blocked:
-                        message('You kick the ' + obj.name +', but it does not budge.', libtcod.gray)
-                        
-                    else:
-                        obj.x = obj.x + dx
-                        obj.y = obj.y +dy
-                        message('You kick the ' + obj.name + '.', libtcod.gray)
-                        
-                        if obj.char == '%':
-                            blood_map[obj.x][obj.y] = 1
+                else:
+                    obj.x = obj.x + dx
+                    obj.y = obj.y +dy
+                    objects.relocate(obj)
+                    message('You kick the ' + obj.name + '.', libtcod.gray)
                     
+                    if obj.char == '%':
+                        blood_map[obj.x][obj.y] = 1
+                
         if not found:
             message('Nothing in that direction to kick.', libtcod.light_gray)
             return 'cancelled'
         else:
             #update the screen
             fov_recompute = True
-            initialize_fov()
             render_all()
     
             
@@ -1653,16 +2642,16 @@ def try_close_door():
             break
         
     if not (dx, dy) == (None, None):
-        if map[player.x+dx][player.y+dy].is_door:
-            for obj in objects:
-                if obj.x == player.x+dx and obj.y == player.y+dy and obj.name == 'open door':
-                    if is_blocked(obj.x, obj.y):
-                        message('Something is blocking the door.',libtcod.lightest_red)
-                    else:
-                        obj.item.use_function(player.x+dx, player.y+dy)
-                        message('You swing the door shut.', libtcod.gray)
-                        Play_BGSFX(SFX_DOORCLOSE)
-                        map_sound(player.x+dx, player.y+dy, intensity=7)
+        door = doors.get((player.x+dx, player.y+dy))
+        if door is not None:
+            if door.name == 'open door':
+                if is_blocked(door.x, door.y):
+                    message('Something is blocking the door.',libtcod.lightest_red)
+                else:
+                    set_door(door.x, door.y, False)
+                    message('You swing the door shut.', libtcod.gray)
+                    Play_BGSFX(SFX_DOORCLOSE)
+                    queue_sound(door.x, door.y, intensity=7)
                     
         else:
             message('No door in that direction to close.', libtcod.white)
@@ -1809,8 +2798,8 @@ def place_objects(room):
                 monster = Object(x, y, 'g', 'Gnoll; Fang of Yeenoghu', libtcod.red,
                                 blocks=True, fighter=fighter_component, ai=ai_component)            
             
-            for obj in objects:
-                if obj.x == x and obj.y == y and not obj.fighter:
+            for obj in objects.at(x, y):
+                if not obj.fighter:
                     dx = libtcod.random_get_int(0, -1, 1)
                     dy = libtcod.random_get_int(0, -1, 1)
                     while map[x+dx][y+dy].block_sight:
@@ -1818,8 +2807,10 @@ def place_objects(room):
                         dy = libtcod.random_get_int(0, -1, 1)
                     obj.x = obj.x + dx
                     obj.y = obj.y + dy
+                    objects.relocate(obj)
             
             objects.append(monster)
+            scheduler.add(monster)
  
     #choose random number of items
     num_items = libtcod.random_get_int(0, 0, max_items)
@@ -1888,8 +2879,7 @@ def place_objects(room):
                 equipment_component = Equipment(slot='left hand', ac_bonus=1)
                 item = Object(x, y, '[', 'Shield', libtcod.darker_orange, equipment=equipment_component)
  
-            objects.append(item)
-            item.send_to_back()  #items appear below other objects
+            objects.append(item)  #items are on a layer below the monsters
             #item.always_visible = True  #items are visible even out-of-FOV, if in an explored area
  
  
@@ -1911,15 +2901,57 @@ def render_bar(x, y, total_width, name, value, maximum, bar_color, back_color):
     libtcod.console_print_ex(panel, x + total_width / 2, y, libtcod.BKGND_NONE, libtcod.CENTER,
                                  name + ': ' + str(int(value)) + '/' + str(int(maximum)))
  
+def move_camera(target_x, target_y):
+    #center the camera on the target (the player), without showing anything past the map's edges
+    global camera_x, camera_y, fov_recompute
+    
+    x = max(0, min(target_x - CAMERA_WIDTH / 2, MAP_WIDTH - CAMERA_WIDTH))
+    y = max(0, min(target_y - CAMERA_HEIGHT / 2, MAP_HEIGHT - CAMERA_HEIGHT))
+    
+    if x != camera_x or y != camera_y:
+        #everything on screen moved, so repaint it all
+        libtcod.console_clear(con)
+        fov_recompute = True
+    (camera_x, camera_y) = (x, y)
+    
+def to_camera_coordinates(x, y):
+    #screen position of a map position, or (None, None) if it's not on screen
+    (x, y) = (x - camera_x, y - camera_y)
+    if x < 0 or y < 0 or x >= CAMERA_WIDTH or y >= CAMERA_HEIGHT:
+        return (None, None)
+    return (x, y)
+    
+def from_camera_coordinates(x, y):
+    #map position of a screen position, or (None, None) if there's no map there
+    if x < 0 or y < 0 or x >= CAMERA_WIDTH or y >= CAMERA_HEIGHT:
+        return (None, None)
+    (x, y) = (x + camera_x, y + camera_y)
+    if x >= MAP_WIDTH or y >= MAP_HEIGHT:
+        return (None, None)
+    return (x, y)
+    
+def camera_cells():
+    #map positions of every tile on screen
+    return [(x, y) for y in range(camera_y, min(camera_y + CAMERA_HEIGHT, MAP_HEIGHT))
+                   for x in range(camera_x, min(camera_x + CAMERA_WIDTH, MAP_WIDTH))]
+    
+def set_screen_background(x, y, color, flag=libtcod.BKGND_SET):
+    #color the background of map position x, y straight on the root console, if it's on screen
+    (x, y) = to_camera_coordinates(x, y)
+    if x is not None:
+        libtcod.console_set_char_background(0, x, y, color, flag)
+ 
 def get_names_under_mouse():
     global mouse
     #return a string with the names of all objects under the mouse
  
-    (x, y) = (mouse.cx, mouse.cy)
+    (x, y) = from_camera_coordinates(mouse.cx, mouse.cy)
+    if x is None:
+        return ''  #the mouse isn't over the map
  
     #create a list with the names of all objects at the mouse's coordinates and in FOV
-    names = [obj.name for obj in objects
-             if obj.x == x and obj.y == y and libtcod.map_is_in_fov(fov_map, obj.x, obj.y)]
+    names = [obj.name for obj in objects.at(x, y)
+             if libtcod.map_is_in_fov(fov_map, obj.x, obj.y)]
  
     names = ', '.join(names)  #join the names, separated by commas
     
@@ -1931,20 +2963,29 @@ def render_all():
     global color_dark_ground, color_light_ground
     global fov_recompute, blood_map
  
+    move_camera(player.x, player.y)
+    
     if fov_recompute:
         #recompute FOV if needed (the player moved or something)
         fov_recompute = False
         libtcod.map_compute_fov(fov_map, player.x, player.y, TORCH_RADIUS, FOV_LIGHT_WALLS, FOV_ALGO)
         
-        #go through all tiles, and set their background color according to the FOV
-        for y in range(MAP_HEIGHT):
-            for x in range(MAP_WIDTH):
-                visible = libtcod.map_is_in_fov(fov_map, x, y)
-                blocks = map[x][y].block_sight
-                door = map[x][y].is_door
+        #go through the tiles on screen, and set their background color according to the FOV.
+        #x, y are screen positions, the tile's map position is mx, my
+        (view_width, view_height) = (min(CAMERA_WIDTH, MAP_WIDTH), min(CAMERA_HEIGHT, MAP_HEIGHT))
+        block_sight = map.window('block_sight', camera_x, camera_y, view_width, view_height)
+        is_door = map.window('is_door', camera_x, camera_y, view_width, view_height)
+        explored = map.window('explored', camera_x, camera_y, view_width, view_height)
+        for y in range(view_height):
+            my = camera_y + y
+            for x in range(view_width):
+                mx = camera_x + x
+                visible = libtcod.map_is_in_fov(fov_map, mx, my)
+                blocks = block_sight[x][y]
+                door = is_door[x][y]
                 if not visible:
                     #if it's not visible right now, the player can only see it if it's explored
-                    if map[x][y].explored:
+                    if explored[x][y]:
                         if blocks:
                             if door:
                                 libtcod.console_set_char_background(con, x, y, color_dark_ground, libtcod.BKGND_SET)
@@ -1954,7 +2995,7 @@ def render_all():
                             libtcod.console_set_char_background(con, x, y, color_dark_ground, libtcod.BKGND_SET)                               
                 else:
                     #since it's visible, explore it
-                    map[x][y].explored = True   
+                    map.explored[mx, my] = True
                     
                     if blocks:
                         if door:
@@ -1962,30 +3003,28 @@ def render_all():
                         else:
                             libtcod.console_set_char_background(con, x, y, color_light_wall, libtcod.BKGND_SET )
                     else:
-                        if blood_map[x][y] > 0:
+                        if blood_map[mx][my] > 0:
                             libtcod.console_set_char_background(con, x, y, libtcod.darker_red, libtcod.BKGND_SET)
                         else:
                             libtcod.console_set_char_background(con, x, y, color_light_ground, libtcod.BKGND_SET )
                     
-    #draw all objects in the list, except the player. we want it to
-    #always appear over all other objects! so it's drawn later.
-    for object in objects:
-        if object != player:
-            object.draw()
-    player.draw()
+    #draw all objects layer by layer. the player is on the top layer, so
+    #it always appears over all other objects!
+    for object in objects.in_render_order():
+        object.draw()
     
     #blit the contents of "con" to the root console
-    libtcod.console_blit(con, 0, 0, MAP_WIDTH, MAP_HEIGHT, 0, 0, 0)
+    libtcod.console_blit(con, 0, 0, CAMERA_WIDTH, CAMERA_HEIGHT, 0, 0, 0)
  
     #draw context hints for the first dungeon level
     if dungeon_level == 1:
         libtcod.console_set_default_background(0, libtcod.light_red)
         libtcod.console_set_default_foreground(0, libtcod.black)
         
-        if player.y >= MAP_HEIGHT/2: #player on bottom half of the screen
-            (tx, ty) = (77, 2)
+        if player.y - camera_y >= CAMERA_HEIGHT/2: #player on bottom half of the screen
+            (tx, ty) = (CAMERA_WIDTH - 3, 2)
         else: #player on top half of the map
-            (tx, ty) = (77, 42)
+            (tx, ty) = (CAMERA_WIDTH - 3, CAMERA_HEIGHT - 1)
             
         if turn_count < 4:
             context_menu("Use the Numpad to move (or arrow keys).", libtcod.light_red, libtcod.black)
@@ -1994,13 +3033,12 @@ def render_all():
             context_menu("Bump into monsters to attack them.", libtcod.light_red, libtcod.black)
             #libtcod.console_print_ex(0, tx, ty, libtcod.BKGND_SET, libtcod.RIGHT, " Bump into monsters to attack them. ")
         
-        for object in objects:
-            if object.x == player.x and object.y == player.y:
-                if object.item:
-                    if map[player.x][player.y].is_door == False:
-                        context_menu("Press [g] to grab an item.", libtcod.light_red, libtcod.black)
-                if object.name == "stairs":
-                        context_menu("Press [,] to go down the stairs.", libtcod.light_red, libtcod.black)
+        for object in objects.at(player.x, player.y):
+            if object.item:
+                if map[player.x][player.y].is_door == False:
+                    context_menu("Press [g] to grab an item.", libtcod.light_red, libtcod.black)
+            if object.name == "stairs":
+                    context_menu("Press [,] to go down the stairs.", libtcod.light_red, libtcod.black)
                         
         myneighbors = [(-1, -1), (0, -1), (1, -1),
                      (-1, 0), (1, 0),
@@ -2046,10 +3084,10 @@ def render_all():
 def context_menu(msg, bgcolor=libtcod.white, fgcolor=libtcod.black, tx=None, ty=None, align=libtcod.RIGHT):
     
     if tx == None or ty == None:
-        if player.y >= MAP_HEIGHT/2: #player on bottom half of the screen
-            (tx, ty) = (77, 2)
+        if player.y - camera_y >= CAMERA_HEIGHT/2: #player on bottom half of the screen
+            (tx, ty) = (CAMERA_WIDTH - 3, 2)
         else: #player on top half of the map
-            (tx, ty) = (77, 42)
+            (tx, ty) = (CAMERA_WIDTH - 3, CAMERA_HEIGHT - 1)
             
     libtcod.console_set_default_background(0, bgcolor)
     libtcod.console_set_default_foreground(0, fgcolor)
@@ -2072,14 +3110,13 @@ def message(new_msg, color = libtcod.white):
         game_msgs.append( (line, color) )
  
 def monster_pickup(monster, x, y):
-        for obj in objects:
-            if obj.x == x and obj.y == y:
-                if obj.name == 'stairs' or obj.name == 'open door' or obj.name == 'closed door' or obj.char == '%' or obj.fighter: #dont try to pick up stairs, doors, 
-                    pass                                                                                                            #corpses, other fighters, or your self.
-                else:
-                    #pick dat shit up
-                    monster.fighter.loot.append(obj)
-                    objects.remove(obj) 
+        for obj in objects.at(x, y):
+            if obj.name == 'stairs' or obj.name == 'open door' or obj.name == 'closed door' or obj.char == '%' or obj.fighter: #dont try to pick up stairs, doors, 
+                pass                                                                                                            #corpses, other fighters, or your self.
+            else:
+                #pick dat shit up
+                monster.fighter.loot.append(obj)
+                objects.remove(obj) 
  
 def player_move_or_attack(dx, dy):
     global fov_recompute
@@ -2096,14 +3133,12 @@ def player_move_or_attack(dx, dy):
  
     #try to find an attackable object there
     target = None
-    for object in objects:
+    if Opt_Auto_Open_Door and (x, y) in doors and doors[(x, y)].name == "closed door":
+        use_door(x, y)
+        door = True
         
-        if object.name == "closed door":
-            if Opt_Auto_Open_Door and object.x == x and object.y == y:
-                object.item.use_function(x, y)
-                door = True
-                
-        if object.fighter and object.x == x and object.y == y:
+    for object in objects.at(x, y):
+        if object.fighter:
             target = object
             break
  
@@ -2115,12 +3150,12 @@ def player_move_or_attack(dx, dy):
         pass
     else:
         player.move(dx, dy)
-        player_dijkstra.clear_goals()
-        player_dijkstra.add_goal(player.x, player.y)
-        #player_dijkstra.recalculate_single(player.x, player.y)
-        player_dijkstra.recalculate_single(player.x, player.y)
+        #the player is the only goal, so just move it and patch up the cells around it
+        player_dijkstra.move_goal(x - dx, y - dy, player.x, player.y)
+        deposit_scent(player.x, player.y)
         fov_recompute = True
 
+
         
 def menu(header, options, width):
     if len(options) > 26: raise ValueError('Cannot have a menu with more than 26 options.')
@@ -2257,17 +3292,16 @@ def handle_keys():
                 
             elif key_char == 'g':
                 #pick up an item
-                for object in objects:  #look for an item in the player's tile
-                    if object.x == player.x and object.y == player.y:
-                        if object == player:
-                            pass
+                for object in objects.at(player.x, player.y):  #look for an item in the player's tile
+                    if object == player:
+                        pass
+                    else:
+                        if object.item:
+                            object.item.pick_up()
+                            break
                         else:
-                            if object.item:
-                                object.item.pick_up()
-                                break
-                            else:
-                                message("You can't pick up the " + object.name +'.', libtcod.gray)
-                                break   
+                            message("You can't pick up the " + object.name +'.', libtcod.gray)
+                            break   
  
             elif key_char == 'i':
                 #show the inventory; if an item is selected, use it
@@ -2473,10 +3507,12 @@ def monster_death(monster):
     
     message('The ' + monster.name + ' dropped ' + gold_drop_amount + ' gold!', libtcod.gold)
         
+    scheduler.remove(monster)
     monster.fighter = None
     monster.ai = None
-    monster.send_to_back()
+    monster.layer = LAYER_CORPSE  #drawn below the monsters still standing
     monster.name = monster.name + ' Corpse'
+    objects.reindex(monster)  #also stops counting it as a blocker and moves it to its new layer
     blood_map[monster.x][monster.y] = 1
     fov_recompute = True
     
@@ -2490,13 +3526,13 @@ def target_tile(max_range=None):
         libtcod.sys_check_for_event(libtcod.EVENT_KEY_PRESS | libtcod.EVENT_MOUSE, key, mouse)
         render_all()
  
-        (x, y) = (mouse.cx, mouse.cy)
+        (x, y) = from_camera_coordinates(mouse.cx, mouse.cy)
  
         if mouse.rbutton_pressed or key.vk == libtcod.KEY_ESCAPE:
             return (None, None)  #cancel if the player right-clicked or pressed Escape
  
         #accept the target if the player clicked in FOV, and in case a range is specified, if it's in that range
-        if (mouse.lbutton_pressed and libtcod.map_is_in_fov(fov_map, x, y) and
+        if (mouse.lbutton_pressed and x is not None and libtcod.map_is_in_fov(fov_map, x, y) and
                 (max_range is None or player.distance(x, y) <= max_range)):
             return (x, y)
  
@@ -2508,8 +3544,8 @@ def target_monster(max_range=None):
             return None
  
         #return the first clicked monster, otherwise continue looping
-        for obj in objects:
-            if obj.x == x and obj.y == y and obj.fighter and obj != player:
+        for obj in objects.at(x, y):
+            if obj.fighter and obj != player:
                 return obj
  
 def closest_monster(max_range):
@@ -2517,7 +3553,7 @@ def closest_monster(max_range):
     closest_enemy = None
     closest_dist = max_range + 1  #start with (slightly more than) maximum range
  
-    for object in objects:
+    for object in objects.having('fighter'):
         if object.fighter and not object == player and libtcod.map_is_in_fov(fov_map, object.x, object.y):
             #calculate distance between this object and the player
             dist = player.distance_to(object)
@@ -2528,25 +3564,29 @@ def closest_monster(max_range):
 
 
 def use_door(x, y):
-    for obj in objects:
-        if obj.x == x and obj.y == y:
+    if doors[(x, y)].name == "closed door":
+        set_door(x, y, True)
+        Play_BGSFX(SFX_DOOR)
+    else:
+        set_door(x, y, False)
         
-            if obj.name == "closed door":
-                obj.name = "open door"
-                obj.char = "-"
-                map[x][y].block_sight = False
-                map[x][y].blocked = False
-                fov_recompute = True
-                initialize_fov()
-                Play_BGSFX(SFX_DOOR)
-            
-            elif obj.name == "open door":
-                obj.name = "closed door"
-                obj.char = "+"
-                map[x][y].block_sight = True
-                map[x][y].blocked = True
-                fov_recompute = True
-                initialize_fov()
+def set_door(x, y, open):
+    #open or close the door at x, y: its look, the tile under it and the FOV map. the ai maps
+    #see the new map_version right away and only redo that tile when they're next used
+    global fov_recompute
+    
+    door = doors[(x, y)]
+    if open:
+        door.name = "open door"
+        door.char = "-"
+    else:
+        door.name = "closed door"
+        door.char = "+"
+    map[x][y].block_sight = not open
+    map[x][y].blocked = not open
+    libtcod.map_set_properties(fov_map, x, y, open, open)
+    fov_recompute = True
+    passability_changed([(x, y)])
 
 def use_oil():
     global fov_recompute, TORCH_RADIUS
@@ -2566,11 +3606,15 @@ def cast_magicmap():
     
     mrange = 600
     
-    #make dijsktra map with player as goal
-    magic_dijsktra = DijkstraMap(MAP_WIDTH, MAP_HEIGHT)
-    magic_dijsktra._clear_map(default=mrange)
-    magic_dijsktra.add_goal(player.x, player.y)
-    magic_dijsktra.recalculate_map(default=mrange)
+    #make dijsktra map with player as goal (free if it was read from the same spot before)
+    magic_dijsktra = cached_dijkstra([(player.x, player.y, 0)], default=mrange)
+    
+    #group the tiles by distance once, so each step of the wave only visits the tiles it colors
+    rings = {}
+    for (i, v) in enumerate(magic_dijsktra.tiles):
+        rings.setdefault(v, []).append((i % MAP_WIDTH, i // MAP_WIDTH))
+    
+    colors = [libtcod.light_yellow, libtcod.lighter_yellow, libtcod.lightest_yellow, libtcod.white]
     
     changes = True
     icount = 0
@@ -2578,28 +3622,11 @@ def cast_magicmap():
         #magic_dijsktra.recalculate_map()
         icount = icount + 1
         changes = False
-        for y in range(MAP_HEIGHT):
-            for x in range(MAP_WIDTH):
-                v = magic_dijsktra.tiles[x][y]
-                
-                if v > icount:
-                    pass
-                elif v == icount:
-                    libtcod.console_set_char_background(0, x, y, libtcod.light_yellow, libtcod.BKGND_SCREEN)
-                    changes = True
-                    map[x][y].explored = True
-                elif v == icount - 1:
-                    libtcod.console_set_char_background(0, x, y, libtcod.lighter_yellow, libtcod.BKGND_SCREEN)
-                    changes = True
-                    map[x][y].explored = True
-                elif v == icount - 2:
-                    libtcod.console_set_char_background(0, x, y, libtcod.lightest_yellow, libtcod.BKGND_SCREEN)
-                    changes = True
-                    map[x][y].explored = True
-                elif v == icount - 3:
-                    libtcod.console_set_char_background(0, x, y, libtcod.white, libtcod.BKGND_SCREEN)
-                    changes = True
-                    map[x][y].explored = True
+        for age in range(len(colors)):
+            for (x, y) in rings.get(icount - age, ()):
+                set_screen_background(x, y, colors[age], libtcod.BKGND_SCREEN)
+                changes = True
+                map[x][y].explored = True
 
                         
         libtcod.console_flush()
@@ -2636,7 +3663,7 @@ def cast_fireball():
     message('The fireball explodes, burning everything within ' + str(FIREBALL_RADIUS) + ' tiles!', libtcod.orange)
  
     for d in range(-1, FIREBALL_RADIUS, 1):
-        for obj in objects:
+        for obj in objects.having('fighter'):
             if int(obj.distance(x, y)) == d and obj.fighter:
                 dmg = FIREBALL_DAMAGE - (d * 4) #damage decays as it moves outward
                 if obj == player:
@@ -2661,7 +3688,7 @@ def cast_confuse():
     message('The eyes of the ' + monster.name + ' look vacant, as he starts to stumble around!', libtcod.light_green)
 
 def throw_gold():
-
+    global gold_dijkstra
     
     found = False
     n = 1
@@ -2693,12 +3720,11 @@ def throw_gold():
         
     
     added = False
-    for obj in objects:
-        if obj.name == "Gold" and obj.x == player.x+dx and obj.y == player.y+dy:
+    for obj in objects.at(player.x+dx, player.y+dy):
+        if obj.name == "Gold" and obj.item:
             #found gold pile at desired position
                 obj.item.count = obj.item.count + n
                 print str(obj.item.count)
-                obj.send_to_back
                 added = True
                 
         if added:
@@ -2710,20 +3736,15 @@ def throw_gold():
         item = Object(player.x+dx, player.y+dy, '$', 'Gold', libtcod.light_yellow, item=item_component)
     
         objects.append(item)
-        item.send_to_back
         
-        gold_dijkstra.clear_goals()
-        for obj in objects:
-            if obj.name == "Gold":
-                gold_dijkstra.add_goal(obj.x, obj.y)
-        gold_dijkstra.recalculate_single(obj.x, obj.y)
+        gold_dijkstra = cached_dijkstra([(obj.x, obj.y, 0) for obj in objects.having('item') if obj.name == "Gold"])
     
 def save_game():
     #open a new empty shelve (possibly overwriting an old one) to write the game data
-    file = shelve.open('savegame', 'n')
+    file = shelve.open('savegame', 'n', protocol=2)  #protocol 2 is the first that can pickle __slots__ classes
     file['map'] = map
     file['blood_map'] = blood_map
-    file['objects'] = objects
+    file['objects'] = list(objects)  #the indexes get rebuilt on load
     file['player_index'] = objects.index(player)  #index of player in objects list
     file['stairs_index'] = objects.index(stairs)  #same for the stairs
     file['inventory'] = inventory
@@ -2736,11 +3757,11 @@ def save_game():
  
 def load_game():
     #open the previously saved shelve and load the game data
-    global map, objects, player, stairs, inventory, game_msgs, game_state, dungeon_level, turn_count, blood_map, kill_counts
+    global map, objects, player, stairs, inventory, game_msgs, game_state, dungeon_level, turn_count, blood_map, kill_counts, scent_map, scheduler, doors
  
     file = shelve.open('savegame', 'r')
     map = file['map']
-    objects = file['objects']
+    objects = ObjectList(file['objects'])
     player = objects[file['player_index']]  #get index of player in objects list and access it
     stairs = objects[file['stairs_index']]  #same for the stairs
     inventory = file['inventory']
@@ -2751,6 +3772,14 @@ def load_game():
     blood_map = file['blood_map']
     kill_counts = file['kill_counts']
     file.close()
+    
+    scent_map = new_scent_map()  #the trail doesn't survive a reload
+    doors = dict(((obj.x, obj.y), obj) for obj in objects.having('door'))
+    
+    #turn order isn't saved either, everyone starts a fresh interval
+    scheduler = TurnScheduler()
+    for obj in objects.having('ai'):
+        scheduler.add(obj)
  
     initialize_fov()
  
@@ -2759,16 +3788,16 @@ def new_game():
  
     #create object representing the player
     
-    fighter_component = Fighter(hp=100, ac=10, strength=10, dexterity=14, luck=10, damage=0, speed=3, xp=0, currency=0 
+    fighter_component = Fighter(hp=100, ac=10, strength=10, dexterity=14, luck=10, damage=0, speed=3, xp=0, currency=0,
                                 atk_sound=SFX_PLAYERATK, death_function=player_death)
-    player = Object(0, 0, chr(2), 'Heroman', libtcod.white, blocks=True, fighter=fighter_component)
+    player = Object(0, 0, chr(2), 'Heroman', libtcod.white, blocks=True, layer=LAYER_PLAYER, fighter=fighter_component)
  
     player.level = 1
+    inventory = []  #before the map is made, placing monsters already asks for the player's speed
     
     kill_counts = []
     
-    scent_map = [[ 0 for y in range(MAP_HEIGHT) ]
-           for x in range(MAP_WIDTH) ]
+    scent_map = new_scent_map()
         
     blood_map = [[ 0 for y in range(MAP_HEIGHT) ]
            for x in range(MAP_WIDTH) ]   
@@ -2787,7 +3816,6 @@ def new_game():
     initialize_fov()
  
     game_state = 'playing'
-    inventory = []
  
     #create the list of game messages and their colors, starts empty
     game_msgs = []
@@ -2813,33 +3841,74 @@ def new_game():
 def next_level():
     Play_BGSFX(SFX_Stairs)
     #advance to the next level
-    global dungeon_level
+    global dungeon_level, scent_map
     message('You take a moment to rest, and recover your strength.', libtcod.light_violet)
     player.fighter.heal(player.fighter.max_hp / 2)  #heal the player by 50%
     
     for y in range(MAP_HEIGHT):
         for x in range(MAP_WIDTH):
             blood_map[x][y] = 0
+    scent_map = new_scent_map()
     
     dungeon_level += 1
     message('You descend deeper into the heart of the dungeon...', libtcod.light_red)
     make_bsp()  #create a fresh new level!
     initialize_fov()
-    
+    initialize_ai_maps()  #nothing on the old level's maps means anything here
+
 def initialize_fov():
     global fov_recompute, fov_map
     fov_recompute = True
+    
+    #a new (or loaded) level, so the ai maps need the new layout too
+    passability_changed()
  
     #create the FOV map, according to the generated map
     fov_map = libtcod.map_new(MAP_WIDTH, MAP_HEIGHT)
+    block_sight = map.as_lists('block_sight')
+    blocked = map.as_lists('blocked')
     for y in range(MAP_HEIGHT):
         for x in range(MAP_WIDTH):
-            libtcod.map_set_properties(fov_map, x, y, not map[x][y].block_sight, not map[x][y].blocked)
+            libtcod.map_set_properties(fov_map, x, y, not block_sight[x][y], not blocked[x][y])
  
     libtcod.console_clear(con)  #unexplored areas start black (which is the default background color)
  
+def initialize_ai_maps():
+    global player_dijkstra, gold_dijkstra, sound_dijkstra, turn_sounds
+    
+    #make the initial dijkstras / AI Maps
+    player_dijkstra = DijkstraMap(MAP_WIDTH, MAP_HEIGHT)
+    gold_dijkstra = DijkstraMap(MAP_WIDTH, MAP_HEIGHT)
+    sound_dijkstra = DijkstraMap(MAP_WIDTH, MAP_HEIGHT)
+    sound_dijkstra._clear_map(0) 
+    turn_sounds = []
+    
+    player_dijkstra.add_goal(player.x, player.y)
+    player_dijkstra.recalculate_map()
+ 
+def world_turn():
+    #everything that happens after the player took a turn
+    global turn_count
+    
+    #do once-a-turn things
+    update_torch()
+    spread_scent()
+    turn_count = turn_count + 1
+    
+    #sounds the player made, so the monsters hear them on this turn's actions
+    apply_turn_events()
+    
+    for object in scheduler.next_turn():
+        if not monster_awake(object):
+            dormant_turn(object)
+        else:
+            object.ai.take_turn()
+            
+    #sounds the monsters made, heard from the next turn on
+    apply_turn_events()
+ 
 def play_game():
-    global key, mouse, player_dijkstra, gold_dijkstra, sound_dijkstra, turn_count
+    global key, mouse
     
     player_action = None
  
@@ -2849,14 +3918,7 @@ def play_game():
     Play_BGM(BGM_CAVEMUSIC)
 
     
-    #make the initial dijkstras / AI Maps
-    player_dijkstra = DijkstraMap(MAP_WIDTH, MAP_HEIGHT)
-    gold_dijkstra = DijkstraMap(MAP_WIDTH, MAP_HEIGHT)
-    sound_dijkstra = DijkstraMap(MAP_WIDTH, MAP_HEIGHT)
-    sound_dijkstra._clear_map(0) 
-    
-    player_dijkstra.add_goal(player.x, player.y)
-    player_dijkstra.recalculate_map()
+    initialize_ai_maps()
     
     
     #main loop
@@ -2867,7 +3929,8 @@ def play_game():
         render_all()
         
         #DijkHeat(player_dijkstra)
-        DijkHeat(sound_dijkstra, False)
+        if sound_dijkstra.active:
+            DijkHeat(sound_dijkstra, False, cells=sound_dijkstra.active)
         #DijkHeat(player_dijkstra, True)
         #DijkHeat(player_dijkstra, False)
         libtcod.console_flush()
@@ -2880,7 +3943,9 @@ def play_game():
             object.clear()
 
         #decay sound/scent maps
-        decay_map(sound_dijkstra)
+        if sound_dijkstra.active:
+            decay_map(sound_dijkstra, 1)
+
           
         #handle keys and exit game if needed
         player_action = handle_keys()
@@ -2891,18 +3956,7 @@ def play_game():
  
         #let monsters take their turn
         elif game_state == 'playing' and player_action != 'didnt-take-turn':
-        
-            #do once-a-turn things
-            update_torch()
-            turn_count = turn_count + 1
-                
-        
-            for object in objects:
-                if object.ai:
-                    object.fighter.counter += object.fighter.speed
-                    while object.fighter.counter >= player.fighter.speed:
-                        object.ai.take_turn()
-                        object.fighter.counter -= player.fighter.speed
+            world_turn()
                         
         #decay sound/scent maps
         #decay_map(sound_dijkstra)
@@ -2939,23 +3993,25 @@ def main_menu():
         elif choice == 2:  #quit
             break
  
-#set and init root console
-libtcod.console_set_custom_font('terminal12x12_gs_ro.png', libtcod.FONT_TYPE_GREYSCALE | libtcod.FONT_LAYOUT_ASCII_INROW)
-libtcod.console_init_root(SCREEN_WIDTH, SCREEN_HEIGHT, "A'Rel; Tombs of the Ancient Kings", False)
+#only start the game when run directly, so the functions above can be imported (see benchmark.py)
+if __name__ == '__main__':
+    #set and init root console
+    libtcod.console_set_custom_font('terminal12x12_gs_ro.png', libtcod.FONT_TYPE_GREYSCALE | libtcod.FONT_LAYOUT_ASCII_INROW)
+    libtcod.console_init_root(SCREEN_WIDTH, SCREEN_HEIGHT, "A'Rel; Tombs of the Ancient Kings", False)
 
-#build additional consoles
-con = libtcod.console_new(MAP_WIDTH, MAP_HEIGHT)
-panel = libtcod.console_new(SCREEN_WIDTH, PANEL_HEIGHT)
+    #build additional consoles
+    con = libtcod.console_new(CAMERA_WIDTH, CAMERA_HEIGHT)
+    panel = libtcod.console_new(SCREEN_WIDTH, PANEL_HEIGHT)
 
-#init pygame / mixer for audio
-pygame.init()
-pygame.mixer.init()
+    #init pygame / mixer for audio
+    pygame.init()
+    pygame.mixer.init()
 
-#set up pygame mixer channels
-CHANNEL_BGM = pygame.mixer.Channel(1)
-CHANNEL_BGSFX = pygame.mixer.Channel(2)
-CHANNEL_ITEMSFX = pygame.mixer.Channel(3)
-CHANNEL_PLAYERCOMBAT = pygame.mixer.Channel(4)
-CHANNEL_NPCCOMBAT = pygame.mixer.Channel(5)
+    #set up pygame mixer channels
+    CHANNEL_BGM = pygame.mixer.Channel(1)
+    CHANNEL_BGSFX = pygame.mixer.Channel(2)
+    CHANNEL_ITEMSFX = pygame.mixer.Channel(3)
+    CHANNEL_PLAYERCOMBAT = pygame.mixer.Channel(4)
+    CHANNEL_NPCCOMBAT = pygame.mixer.Channel(5)
 
-main_menu()
+    main_menu()
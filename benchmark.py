@@ -0,0 +1,166 @@
+#times the DijkstraMap operations on seeded BSP levels, and the turn scheduler, one JSON result per line
+#
+#   python benchmark.py                          every backend, size, goal count and range
+#   python benchmark.py --backend numpy --repeat 20 --output bench_output.txt
+#
+#each line has the operation, backend, map size, goal count, range and seed,
+#plus the best and mean time of one call in milliseconds (the scheduler lines have the
+#actor count instead of the level), so runs of different
+#backends (or different versions of ArelMain.py) can be lined up side by side
+
+import argparse
+import json
+import random
+import timeit
+
+import libtcodpy as libtcod
+import ArelMain as game
+
+SIZES = [(40, 25), (80, 43), (160, 86), (500, 500)]
+GOAL_COUNTS = [1, 4, 16]
+RANGES = [5, 9, 15]
+BACKENDS = ['python', 'numpy']
+ACTOR_COUNTS = [10, 100, 1000]
+ACTOR_SPEEDS = [2.5, 2.8, 3]  #the speeds the monsters have in the game, the player's is 3
+
+
+def make_level(width, height, seed):
+    #dig a level the same way make_bsp does, minus the player, monsters and items
+    game.MAP_WIDTH = width
+    game.MAP_HEIGHT = height
+    random.seed(seed)
+    rng = libtcod.random_new_from_seed(seed)
+    libtcod.random_restore(None, rng)  #reseeds the default generator the level code uses
+    libtcod.random_delete(rng)
+
+    game.objects = game.ObjectList()
+    game.doors = {}
+    game.map = game.TileMap(width, height)
+    game.bsp_rooms = []
+
+    bsp = libtcod.bsp_new_with_size(0, 0, width, height)
+    libtcod.bsp_split_recursive(bsp, 0, game.DEPTH, game.MIN_SIZE + 1, game.MIN_SIZE + 1, 1.5, 1.5)
+    libtcod.bsp_traverse_inverted_level_order(bsp, game.traverse_node)
+    libtcod.bsp_delete(bsp)
+
+    for attempts in range(0, 500):
+        game.make_door(libtcod.random_get_int(0, 1, width - 1), libtcod.random_get_int(0, 1, height - 1))
+
+    #new layout (and maybe a new size), so drop everything built from the old one
+    game.passability_changed()
+
+    return [(x, y) for x in range(width) for y in range(height) if not game.map[x][y].block_sight]
+
+
+def time_op(setup, op, repeat):
+    #best and mean time of op() in milliseconds, setup() runs untimed before each call
+    times = []
+    for i in range(repeat):
+        setup()
+        start = timeit.default_timer()
+        op()
+        times.append((timeit.default_timer() - start) * 1000.0)
+    return min(times), sum(times) / len(times)
+
+
+def run_level(backend, width, height, seed, repeat, emit):
+    floor = make_level(width, height, seed)
+    rnd = random.Random(seed)
+    result = {'backend': backend, 'width': width, 'height': height, 'seed': seed, 'repeat': repeat}
+
+    def report(op, goals, drange, timing):
+        line = dict(result, op=op, goals=goals, range=drange)
+        (line['best_ms'], line['mean_ms']) = timing
+        emit(line)
+
+    for goals in GOAL_COUNTS:
+        dmap = game.DijkstraMap(width, height, backend)
+        for (x, y) in rnd.sample(floor, min(goals, len(floor))):
+            dmap.add_goal(x, y)
+        for drange in RANGES:
+            report('recalculate_map', goals, drange,
+                   time_op(lambda: None, lambda: dmap.recalculate_map(drange), repeat))
+
+    for drange in RANGES:
+        dmap = game.DijkstraMap(width, height, backend)
+        (tx, ty) = rnd.choice(floor)
+        dmap.add_goal(tx, ty)
+        report('recalculate_single', 1, drange,
+               time_op(lambda: None, lambda: dmap.recalculate_single(tx, ty, drange, True), repeat))
+
+    #one call per floor cell, the way every monster asks once per turn
+    dmap = game.DijkstraMap(width, height, backend)
+    dmap.add_goal(*rnd.choice(floor))
+    dmap.recalculate_map()
+    def all_moves():
+        for (x, y) in floor:
+            dmap.get_move_options(x, y)
+    (best, mean) = time_op(lambda: None, all_moves, repeat)
+    report('get_move_options', 1, 9, (best / len(floor), mean / len(floor)))
+
+    for drange in RANGES:
+        (sx, sy) = rnd.choice(floor)
+        def quiet():
+            game.sound_dijkstra = game.DijkstraMap(width, height, backend)
+            game.sound_dijkstra._clear_map(0)
+        report('map_sound', 1, drange,
+               time_op(quiet, lambda: game.map_sound(sx, sy, drange), repeat))
+
+        def noisy():
+            quiet()
+            game.map_sound(sx, sy, drange)
+        report('decay_map', 1, drange,
+               time_op(noisy, lambda: game.decay_map(game.sound_dijkstra), repeat))
+
+
+def run_scheduler(actors, seed, repeat, emit):
+    #one player turn of TurnScheduler.next_turn, with every actor taking its action
+    rnd = random.Random(seed)
+    game.inventory = []
+    game.player = game.Object(0, 0, '@', 'player', libtcod.white, blocks=True,
+                              fighter=game.Fighter(hp=100, ac=10, strength=10, dexterity=14, luck=10,
+                                                   damage=0, speed=3, xp=0))
+    scheduler = game.TurnScheduler()
+    for i in range(actors):
+        fighter_component = game.Fighter(hp=1, ac=0, strength=1, dexterity=1, luck=1, damage=1,
+                                         speed=rnd.choice(ACTOR_SPEEDS), xp=0)
+        scheduler.add(game.Object(0, 0, 'r', 'rat', libtcod.sepia, blocks=True,
+                                  fighter=fighter_component, ai=game.BasicMonster()))
+
+    line = {'op': 'next_turn', 'actors': actors, 'seed': seed, 'repeat': repeat}
+    (line['best_ms'], line['mean_ms']) = time_op(lambda: None, lambda: list(scheduler.next_turn()), repeat)
+    emit(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Time the DijkstraMap operations on generated levels.')
+    parser.add_argument('--backend', action='append', choices=BACKENDS,
+                        help='backend to time, can be given more than once (default: all available)')
+    parser.add_argument('--repeat', type=int, default=10, help='timed calls per case (default: 10)')
+    parser.add_argument('--seed', type=int, action='append', help='level seed, can be given more than once (default: 1)')
+    parser.add_argument('--output', help='also write the results to this file')
+    args = parser.parse_args()
+
+    backends = args.backend or [b for b in BACKENDS if b != 'numpy' or game.numpy is not None]
+    out = open(args.output, 'w') if args.output else None
+
+    def emit(line):
+        text = json.dumps(line, sort_keys=True)
+        print text
+        if out:
+            out.write(text + '\n')
+            out.flush()
+
+    for seed in args.seed or [1]:
+        for (width, height) in SIZES:
+            for backend in backends:
+                run_level(backend, width, height, seed, args.repeat, emit)
+        for actors in ACTOR_COUNTS:
+            run_scheduler(actors, seed, args.repeat, emit)
+
+    if out:
+        out.close()
+
+
+if __name__ == '__main__':
+    main()
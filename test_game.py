@@ -0,0 +1,391 @@
+#plays a few turns of a fresh game without a window or speakers
+#
+#   python -m unittest test_game
+#
+#skipped when libtcod or pygame can't be loaded
+
+import os
+import random
+import unittest
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+
+try:
+    import libtcodpy as libtcod
+    import pygame
+    missing = None
+except Exception as error:  #libtcodpy raises a plain Exception when it can't find the library
+    missing = str(error)
+
+if missing is None:
+    import ArelMain as game
+
+
+def setUpModule():
+    if missing is not None:
+        return
+    #the sounds and the font are loaded from paths relative to the game folder
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+
+    game.con = libtcod.console_new(game.CAMERA_WIDTH, game.CAMERA_HEIGHT)
+    game.panel = libtcod.console_new(game.SCREEN_WIDTH, game.PANEL_HEIGHT)
+    pygame.mixer.init()
+    game.CHANNEL_BGM = pygame.mixer.Channel(1)
+    game.CHANNEL_BGSFX = pygame.mixer.Channel(2)
+    game.CHANNEL_ITEMSFX = pygame.mixer.Channel(3)
+    game.CHANNEL_PLAYERCOMBAT = pygame.mixer.Channel(4)
+    game.CHANNEL_NPCCOMBAT = pygame.mixer.Channel(5)
+
+
+def play_turns(turns, seed):
+    #walk the player around at random, the same way play_game runs a turn
+    rnd = random.Random(seed)
+    for turn in range(turns):
+        game.player.fighter.hp = game.player.fighter.max_hp  #nobody dies in here
+        if game.sound_dijkstra.active:
+            game.decay_map(game.sound_dijkstra, 1)
+        (dx, dy) = rnd.choice(game.DijkstraMap.neighbors)
+        game.player_move_or_attack(dx, dy)
+        game.world_turn()
+
+
+@unittest.skipIf(missing is not None, 'libtcod or pygame is not available: %s' % missing)
+class NewGameTest(unittest.TestCase):
+
+    def test_new_game_then_turns(self):
+        random.seed(1)
+        game.new_game()
+        game.initialize_ai_maps()
+        self.assertEqual([obj.name for obj in game.inventory][:1], ['Chipped Dagger'])
+
+        play_turns(50, 1)
+        self.assertEqual(game.game_state, 'playing')
+        self.assertEqual(game.turn_count, 50)
+
+    def test_a_big_level(self):
+        #the per-turn work only looks near the player and whatever changed, so this should play
+        #about as fast as a normal level once it's made
+        size = (game.MAP_WIDTH, game.MAP_HEIGHT)
+        (game.MAP_WIDTH, game.MAP_HEIGHT) = (500, 500)
+        try:
+            random.seed(6)
+            game.new_game()
+            game.initialize_ai_maps()
+            play_turns(30, 6)
+            self.assertEqual(game.turn_count, 30)
+        finally:
+            (game.MAP_WIDTH, game.MAP_HEIGHT) = size
+
+    def test_next_level_leaves_only_the_player_goal(self):
+        random.seed(7)
+        game.new_game()
+        game.initialize_ai_maps()
+        for level in range(3):
+            play_turns(5, level)
+            game.next_level()
+            play_turns(5, level)
+            self.assertEqual(game.player_dijkstra.goals, [(game.player.x, game.player.y, 0)])
+
+    def test_far_monsters_sleep_on_a_new_level(self):
+        random.seed(8)
+        game.new_game()
+        game.initialize_ai_maps()
+        fighter_component = game.Fighter(hp=1, ac=0, strength=1, dexterity=1, luck=1, damage=1, speed=1, xp=0)
+        monster = game.Object(0, 0, 'r', 'rat', libtcod.sepia, blocks=True, fighter=fighter_component,
+                              ai=game.BasicMonster())
+        for level in range(3):
+            play_turns(5, level)
+            game.next_level()
+            (x, y) = (game.player.x, game.player.y)
+            libtcod.map_compute_fov(game.fov_map, x, y, game.TORCH_RADIUS, game.FOV_LIGHT_WALLS, game.FOV_ALGO)
+
+            #out of sight and out of WAKE_DISTANCE of the player nothing wakes up, not even
+            #where the player stood on the level above
+            for cx in range(game.MAP_WIDTH):
+                for cy in range(game.MAP_HEIGHT):
+                    if (not game.map.blocked[cx, cy] and not libtcod.map_is_in_fov(game.fov_map, cx, cy)
+                            and max(abs(cx - x), abs(cy - y)) > game.WAKE_DISTANCE):
+                        (monster.x, monster.y) = (cx, cy)
+                        self.assertFalse(game.monster_awake(monster), (cx, cy))
+
+    def test_second_game_starts_with_an_empty_inventory(self):
+        random.seed(2)
+        game.new_game()
+        game.initialize_ai_maps()
+        equipment_component = game.Equipment(slot='feet', speed_bonus=5)
+        boots = game.Object(0, 0, '[', 'Old Boots', libtcod.sky, equipment=equipment_component)
+        game.inventory.append(boots)
+        equipment_component.equip()
+        play_turns(5, 2)
+
+        game.new_game()
+        self.assertNotIn(boots, game.inventory)
+        #the monsters of the new level were scheduled for the new player, not the one in boots
+        self.assertTrue(game.scheduler.entries)
+        for (actor, entry) in game.scheduler.entries.items():
+            self.assertEqual(entry[0], game.scheduler.interval(actor))
+
+    def test_scheduler_keeps_the_pacing_of_every_speed(self):
+        random.seed(9)
+        game.new_game()
+        player_speed = int(round(game.player.fighter.speed * 10))
+        scheduler = game.TurnScheduler()
+        actions = {}
+        def add(speed):
+            fighter_component = game.Fighter(hp=1, ac=0, strength=1, dexterity=1, luck=1, damage=1, speed=speed, xp=0)
+            monster = game.Object(0, 0, 'r', 'rat', libtcod.sepia, blocks=True, fighter=fighter_component,
+                                  ai=game.BasicMonster())
+            scheduler.add(monster)
+            actions[monster] = 0
+            return monster
+        first = [add(speed) for speed in (2.5, 2.8, 3)]
+        for turn in range(10):
+            for actor in scheduler.next_turn():
+                actions[actor] += 1
+        late = add(2.7)  #a speed the clock isn't counting in yet
+        for turn in range(2990):
+            for actor in scheduler.next_turn():
+                actions[actor] += 1
+
+        for monster in first:
+            self.assertEqual(actions[monster], 3000 * int(round(monster.fighter.speed * 10)) // player_speed)
+        self.assertEqual(actions[late], 2990 * 27 // player_speed)
+
+
+@unittest.skipIf(missing is not None, 'libtcod or pygame is not available: %s' % missing)
+class DijkstraMapTest(unittest.TestCase):
+
+    def setUp(self):
+        random.seed(3)
+        game.new_game()
+        self.floor = [(x, y) for x in range(game.MAP_WIDTH) for y in range(game.MAP_HEIGHT)
+                      if not game.map.blocked[x, y]]
+
+    def rebuilt(self, dmap):
+        fresh = game.DijkstraMap(dmap.width, dmap.height, dmap.backend)
+        fresh.goals = list(dmap.goals)
+        fresh.recalculate_map(dmap.default, dmap.doorstop)
+        return [int(v) for v in fresh.tiles]
+
+    def test_move_goal_matches_a_rebuild(self):
+        for backend in ('python', 'numpy'):
+            rnd = random.Random(3)
+            dmap = game.DijkstraMap(game.MAP_WIDTH, game.MAP_HEIGHT, backend)
+            (x, y) = rnd.choice(self.floor)
+            dmap.add_goal(*rnd.choice(self.floor))  #one that stays put
+            dmap.add_goal(x, y)
+            dmap.recalculate_map()
+            for step in range(30):
+                (new_x, new_y) = rnd.choice([(x + dx, y + dy) for (dx, dy) in game.DijkstraMap.neighbors
+                                             if (x + dx, y + dy) in self.floor] or [(x, y)])
+                dmap.move_goal(x, y, new_x, new_y)
+                (x, y) = (new_x, new_y)
+                self.assertEqual([int(v) for v in dmap.tiles], self.rebuilt(dmap))
+
+    def test_move_goal_after_a_door_matches_a_rebuild(self):
+        #every door once, shut and then open again, each time with the goal right next to it
+        for backend in ('python', 'numpy'):
+            dmap = game.DijkstraMap(game.MAP_WIDTH, game.MAP_HEIGHT, backend)
+            (x, y) = self.floor[0]
+            dmap.add_goal(x, y)
+            dmap.recalculate_map()
+            for (door_x, door_y) in sorted(game.doors):
+                (new_x, new_y) = [(door_x + dx, door_y + dy) for (dx, dy) in game.DijkstraMap.neighbors
+                                  if (door_x + dx, door_y + dy) in self.floor][0]
+                for open in (False, True):
+                    game.set_door(door_x, door_y, open)
+                    dmap.move_goal(x, y, new_x, new_y)
+                    (x, y) = (new_x, new_y)
+                    self.assertEqual(dmap.version, game.map_version)
+                    self.assertEqual([int(v) for v in dmap.tiles], self.rebuilt(dmap))
+
+    def test_move_goal_after_far_doors_matches_a_rebuild(self):
+        #on a big level, doors near the goal and doors far past its reach change in the same turn.
+        #above 101 the far ones still go from the cap to the default and back
+        size = (game.MAP_WIDTH, game.MAP_HEIGHT)
+        (game.MAP_WIDTH, game.MAP_HEIGHT) = (500, 500)
+        try:
+            random.seed(9)
+            game.new_game()
+            (x, y) = (game.player.x, game.player.y)
+            (other_x, other_y) = [(x + dx, y + dy) for (dx, dy) in game.DijkstraMap.neighbors
+                                  if not game.map.blocked[x + dx, y + dy]][0]
+            doors = sorted(game.doors, key=lambda door: max(abs(door[0] - x), abs(door[1] - y)))
+            self.assertTrue(max(abs(doors[-1][0] - x), abs(doors[-1][1] - y)) > 101)
+            for backend in ('python', 'numpy'):
+                dmap = game.DijkstraMap(500, 500, backend)
+                dmap.add_goal(x, y)
+                dmap.recalculate_map(200, True)
+                for changed in zip(doors[:3], doors[-3:]):
+                    for open in (False, True):
+                        for (door_x, door_y) in changed:
+                            game.set_door(door_x, door_y, open)
+                        dmap.move_goal(x, y, other_x, other_y)
+                        (x, y, other_x, other_y) = (other_x, other_y, x, y)
+                        self.assertEqual([int(v) for v in dmap.tiles], self.rebuilt(dmap))
+        finally:
+            (game.MAP_WIDTH, game.MAP_HEIGHT) = size
+
+    def test_move_goal_without_a_goal_replaces_the_goals(self):
+        dmap = game.DijkstraMap(game.MAP_WIDTH, game.MAP_HEIGHT)
+        dmap.add_goal(*self.floor[0])
+        dmap.recalculate_map()
+        (x, y) = self.floor[-1]
+        dmap.move_goal(self.floor[1][0], self.floor[1][1], x, y)
+        self.assertEqual(dmap.goals, [(x, y, 0)])
+        self.assertEqual([int(v) for v in dmap.tiles], self.rebuilt(dmap))
+
+    def test_neighbor_offsets_stay_in_the_map(self):
+        dmap = game.DijkstraMap(5, 4)
+        for y in range(4):
+            for x in range(5):
+                expected = [(dx, dy, dy * 5 + dx) for (dx, dy) in game.DijkstraMap.neighbors
+                            if dmap.point_in_map(x + dx, y + dy)]
+                self.assertEqual(list(dmap.neighbor_offsets(x, y)), expected)
+
+    def test_recalculate_single_leaves_the_rest_alone(self):
+        dmap = game.DijkstraMap(game.MAP_WIDTH, game.MAP_HEIGHT)
+        (x, y) = self.floor[0]
+        dmap.add_goal(x, y)
+        dmap.recalculate_map()
+        before = list(dmap.tiles)
+
+        (tx, ty) = self.floor[-1]
+        dmap.clear_goals()
+        dmap.add_goal(tx, ty)
+        dmap.recalculate_single(tx, ty, 5)
+        for (cx, cy) in self.floor:
+            if not (tx - 5 <= cx < tx + 5 and ty - 5 <= cy < ty + 5):
+                #the scores of the old goal stay outside the window
+                self.assertEqual(dmap.cell_at(cx, cy), before[cy * game.MAP_WIDTH + cx])
+
+
+@unittest.skipIf(missing is not None, 'libtcod or pygame is not available: %s' % missing)
+class SoundMapTest(unittest.TestCase):
+
+    def setUp(self):
+        random.seed(4)
+        game.new_game()
+        game.initialize_ai_maps()
+        self.sound = game.sound_dijkstra
+
+    def test_a_new_sound_keeps_the_older_sound(self):
+        game.map_sound(game.player.x, game.player.y, 10)
+        before = dict(((x, y), self.sound.cell_at(x, y)) for (x, y) in self.sound.active)
+
+        #somewhere out of earshot of the first one
+        open_cells = game.get_open_lists(True)
+        far = [(x, y) for x in range(game.MAP_WIDTH) for y in range(game.MAP_HEIGHT)
+               if open_cells[y * game.MAP_WIDTH + x] and max(abs(x - game.player.x), abs(y - game.player.y)) > 20]
+        (x, y) = far[0]
+        game.map_sound(x, y, 10)
+        self.assertEqual(self.sound.cell_at(x, y), 10)
+        for (cell, v) in before.items():
+            self.assertEqual(self.sound.cell_at(*cell), v)
+
+        #and both fade away
+        for turn in range(10):
+            game.decay_map(game.sound_dijkstra, 1)
+        self.assertFalse(self.sound.active)
+
+    def test_sounds_in_one_turn_keep_the_loudest(self):
+        (x, y) = (game.player.x, game.player.y)
+        game.queue_sound(x, y, 4)
+        game.queue_sound(x, y, 8)
+        game.queue_sound(x, y, 6)
+        game.apply_turn_events()
+        self.assertEqual(self.sound.cell_at(x, y), 8)
+
+    def test_monsters_hear_the_sounds_of_the_same_turn(self):
+        #a door the player slams wakes up a sleeping monster on its very next action
+        (px, py) = (game.player.x, game.player.y)
+        libtcod.map_compute_fov(game.fov_map, px, py, game.TORCH_RADIUS, game.FOV_LIGHT_WALLS, game.FOV_ALGO)
+        (x, y) = [(x, y) for x in range(game.MAP_WIDTH) for y in range(game.MAP_HEIGHT)
+                  if not game.is_blocked(x, y) and not libtcod.map_is_in_fov(game.fov_map, x, y)
+                  and max(abs(x - px), abs(y - py)) > 20][0]
+        fighter_component = game.Fighter(hp=1, ac=0, strength=1, dexterity=1, luck=1, damage=1,
+                                         speed=game.player.fighter.speed, xp=0)
+        monster = game.Object(x, y, 'r', 'rat', libtcod.sepia, blocks=True, fighter=fighter_component,
+                              ai=game.BasicMonster())
+        game.objects.append(monster)
+        game.scheduler.add(monster)
+
+        game.queue_sound(x, y, 10)
+        game.world_turn()
+        self.assertTrue(monster.ai.awake)
+
+
+@unittest.skipIf(missing is not None, 'libtcod or pygame is not available: %s' % missing)
+class ObjectListTest(unittest.TestCase):
+
+    def potion(self, x):
+        return game.Object(x, 1, '!', 'potion %d' % x, libtcod.violet, item=game.Item())
+
+    def rat(self, x):
+        fighter_component = game.Fighter(hp=1, ac=0, strength=1, dexterity=1, luck=1, damage=1, speed=1, xp=0)
+        return game.Object(x, 2, 'r', 'rat %d' % x, libtcod.sepia, blocks=True, fighter=fighter_component)
+
+    def assertIndexed(self, objects):
+        self.assertEqual(objects.having('item'), [obj for obj in objects if obj.item])
+        self.assertEqual(objects.having('fighter'), [obj for obj in objects if obj.fighter])
+        self.assertEqual(sorted(objects.tile_of.values()), sorted((obj.x, obj.y) for obj in objects))
+        self.assertEqual(sum(sum(column) for column in objects.occupied), len([obj for obj in objects if obj.blocks]))
+
+    def test_indexes_follow_the_list(self):
+        objects = game.ObjectList(self.potion(x) for x in range(1, 6))
+        objects.extend([self.rat(1), self.rat(2)])
+        objects += [self.potion(6)]
+        self.assertIndexed(objects)
+
+        objects.pop()
+        objects.pop(0)
+        del objects[-1]
+        self.assertEqual(len(objects), 5)
+        self.assertIndexed(objects)
+        self.assertEqual(len(objects.at(1, 2)), 1)
+        self.assertEqual(objects.at(2, 2), [])
+
+    def test_assignment_is_refused(self):
+        objects = game.ObjectList([self.potion(1), self.potion(2)])
+        with self.assertRaises(TypeError):
+            objects[0] = self.potion(3)
+        with self.assertRaises(TypeError):
+            objects[0:1] = []
+        with self.assertRaises(TypeError):
+            del objects[0:1]
+        self.assertEqual(len(objects), 2)
+        self.assertIndexed(objects)
+
+
+@unittest.skipIf(missing is not None, 'libtcod or pygame is not available: %s' % missing)
+class ScentTest(unittest.TestCase):
+
+    def setUp(self):
+        if game.numpy is None:
+            self.skipTest('no scent without numpy')
+        random.seed(5)
+        game.new_game()
+        game.initialize_ai_maps()
+
+    def test_scent_stays_inside_its_box(self):
+        play_turns(30, 5)
+        self.assertTrue(game.scent_box)
+        (x0, y0, x1, y1) = game.scent_box
+        (xs, ys) = game.numpy.nonzero(game.scent_map)
+        self.assertEqual((xs.min(), ys.min(), xs.max(), ys.max()), (x0, y0, x1, y1))
+        #nothing away from the trail points anywhere
+        steps = game.scent_steps.copy()
+        steps[max(x0 - 1, 0):x1 + 2, max(y0 - 1, 0):y1 + 2] = -1
+        self.assertTrue((steps == -1).all())
+
+        #with nobody leaving a trail it all evaporates
+        for turn in range(100):
+            game.spread_scent()
+        self.assertEqual(game.scent_box, None)
+        self.assertFalse(game.scent_map.any())
+        self.assertTrue((game.scent_steps == -1).all())
+
+
+if __name__ == '__main__':
+    unittest.main()